@@ -1,7 +1,10 @@
 import io
 import json
+import os
+import tempfile
 from docx import Document
 from docx.shared import Pt, Inches
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -9,6 +12,12 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowabl
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
 import pdfplumber
 
+from apps.parser_app.utils.page_pool import iter_page_ranges, local_path, should_parallelize
+
+# Увеличивать при любом изменении вывода editor_json_to_docx_file / editor_json_to_pdf_file:
+# закэшированные экспорты (export_cache.py) перестанут совпадать.
+CONVERTER_VERSION = '1'
+
 
 def normalize_owner_id(request):
     if hasattr(request, 'user') and request.user and hasattr(request.user, 'id') and request.user.id:
@@ -16,33 +25,124 @@ def normalize_owner_id(request):
     return 1
 
 
-def extract_text_from_node(node):
-    if isinstance(node, str):
-        return node
-    if isinstance(node, dict):
-        if node.get('type') == 'text':
-            return node.get('text', '')
-        children = node.get('content', [])
-        return ''.join(extract_text_from_node(child) for child in children)
-    if isinstance(node, list):
-        return ''.join(extract_text_from_node(child) for child in node)
-    return ''
+# Роли узла при обходе content_json (walk_content): от роли зависит, во что
+# попадает текст — только в plain text или ещё в абзац для DOCX/PDF.
+_TOP, _LIST, _ITEM, _INLINE, _OTHER = range(5)
+
+
+class ContentWalk:
+    """
+    Результат одного обхода content_json.
+    blocks — абзацы для DOCX/PDF в порядке документа:
+    {'type': 'heading'|'paragraph', 'level', 'runs'} или
+    {'type': 'bulletList'|'orderedList', 'items': [runs, ...]};
+    runs — [(text-узел, direct)], direct — узел прямо в content абзаца
+    (DOCX берёт только такие, PDF — все вложенные).
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.block_texts = []
+
+    @property
+    def text(self):
+        return '\n'.join(text for text in self.block_texts if text)
+
+    @property
+    def word_count(self):
+        return sum(len(text.split()) for text in self.block_texts)
+
+    def stats(self):
+        return {'blocks': len(self.block_texts), 'words': self.word_count, 'characters': len(self.text)}
+
+
+def walk_content(content_json, collect_blocks=True):
+    """
+    Один итеративный обход (явный стек вместо рекурсии — глубокая
+    вложенность списков не упирается в лимит рекурсии): plain text каждого
+    блока верхнего уровня, абзацы с runs для DOCX/PDF и статистика.
+    collect_blocks=False — только текст и статистика, без абзацев.
+    """
+    walk = ContentWalk()
+    if not content_json or not isinstance(content_json, dict):
+        return walk
+    if not collect_blocks:
+        walk.block_texts = [_block_text(block) for block in content_json.get('content', [])]
+        return walk
+
+    for block in content_json.get('content', []):
+        parts = []
+        stack = [(block, _TOP, None, False)]
+        pop, push = stack.pop, stack.extend
+        while stack:
+            node, role, owner, direct = pop()
+            if isinstance(node, dict):
+                node_type = node.get('type')
+                if node_type == 'text':
+                    parts.append(node.get('text', ''))
+                    if role == _INLINE:
+                        owner.append((node, direct))
+                    continue
+                children = node.get('content')
+                if role == _OTHER:
+                    if children:
+                        push([(child, _OTHER, None, False) for child in reversed(children)])
+                    continue
+
+                child_role, child_owner, child_direct = _OTHER, None, False
+                if role == _INLINE:
+                    child_role, child_owner = _INLINE, owner
+                elif role == _TOP:
+                    block_type = node.get('type', 'paragraph')
+                    if block_type in ('heading', 'paragraph'):
+                        unit = {'type': block_type, 'level': node.get('attrs', {}).get('level', 1), 'runs': []}
+                        walk.blocks.append(unit)
+                        child_role, child_owner, child_direct = _INLINE, unit['runs'], True
+                    elif block_type in ('bulletList', 'orderedList'):
+                        unit = {'type': block_type, 'items': []}
+                        walk.blocks.append(unit)
+                        child_role, child_owner = _LIST, unit['items']
+                elif role == _LIST and node_type == 'listItem':
+                    child_role, child_owner = _ITEM, owner
+                elif role == _ITEM and node_type == 'paragraph':
+                    runs = []
+                    owner.append(runs)
+                    child_role, child_owner, child_direct = _INLINE, runs, True
+                if children:
+                    push([(child, child_role, child_owner, child_direct) for child in reversed(children)])
+            elif isinstance(node, str):
+                parts.append(node)
+            elif isinstance(node, list):
+                push([(child, _OTHER, None, False) for child in reversed(node)])
+
+        walk.block_texts.append(''.join(parts))
+
+    return walk
+
+
+def _block_text(block):
+    """Plain text блока без ролей и абзацев — самый частый случай (content_text)."""
+    parts = []
+    stack = [block]
+    pop, push, append = stack.pop, stack.extend, parts.append
+    while stack:
+        node = pop()
+        if isinstance(node, dict):
+            if node.get('type') == 'text':
+                append(node.get('text', ''))
+            else:
+                children = node.get('content')
+                if children:
+                    push(reversed(children))
+        elif isinstance(node, str):
+            append(node)
+        elif isinstance(node, list):
+            push(reversed(node))
+    return ''.join(parts)
 
 
 def editor_json_to_plain_text(content_json):
-    if not content_json:
-        return ''
-    
-    doc = content_json if isinstance(content_json, dict) else {}
-    content = doc.get('content', [])
-    
-    lines = []
-    for block in content:
-        text = extract_text_from_node(block)
-        if text:
-            lines.append(text)
-    
-    return '\n'.join(lines)
+    return walk_content(content_json, collect_blocks=False).text
 
 
 def get_text_with_marks(node):
@@ -63,63 +163,83 @@ def get_text_with_marks(node):
     return ''
 
 
-def process_content_for_pdf(content):
-    result = []
-    for node in content:
-        if node.get('type') == 'text':
-            result.append(get_text_with_marks(node))
-        elif 'content' in node:
-            result.extend(process_content_for_pdf(node.get('content', [])))
-    return result
+def editor_json_to_docx_bytes(content_json):
+    buffer = io.BytesIO()
+    editor_json_to_docx_file(content_json, buffer)
+    return buffer.getvalue()
 
 
-def editor_json_to_docx_bytes(content_json):
+def editor_json_to_docx_file(content_json, out):
+    """Пишет DOCX в out (файл, открытый на запись); пустой контент — пустой файл."""
     doc = Document()
     
     if not content_json:
-        return io.BytesIO()
+        return
     
-    content = content_json.get('content', [])
+    add_styled = _StyledParagraphs(doc)
     
-    for block in content:
-        block_type = block.get('type', 'paragraph')
-        block_content = block.get('content', [])
+    for block in walk_content(content_json).blocks:
+        block_type = block['type']
         
         if block_type == 'heading':
-            level = block.get('attrs', {}).get('level', 1)
-            p = doc.add_heading(level=min(level, 9))
-            for node in block_content:
-                add_run_to_paragraph(p, node)
+            level = min(block['level'], 9)
+            if level < 0:
+                raise ValueError(f'level must be in range 0-9, got {level}')
+            p = add_styled('Title' if level == 0 else f'Heading {level}')
+            add_runs_to_paragraph(p, block['runs'])
         
         elif block_type == 'paragraph':
             p = doc.add_paragraph()
-            for node in block_content:
-                add_run_to_paragraph(p, node)
-        
-        elif block_type == 'bulletList':
-            for item in block_content:
-                if item.get('type') == 'listItem':
-                    item_content = item.get('content', [])
-                    for para in item_content:
-                        if para.get('type') == 'paragraph':
-                            p = doc.add_paragraph(style='List Bullet')
-                            for node in para.get('content', []):
-                                add_run_to_paragraph(p, node)
+            add_runs_to_paragraph(p, block['runs'])
         
-        elif block_type == 'orderedList':
-            for item in block_content:
-                if item.get('type') == 'listItem':
-                    item_content = item.get('content', [])
-                    for para in item_content:
-                        if para.get('type') == 'paragraph':
-                            p = doc.add_paragraph(style='List Number')
-                            for node in para.get('content', []):
-                                add_run_to_paragraph(p, node)
+        else:
+            style = 'List Bullet' if block_type == 'bulletList' else 'List Number'
+            for runs in block['items']:
+                p = add_styled(style)
+                add_runs_to_paragraph(p, runs)
     
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer.getvalue()
+    doc.save(out)
+
+
+def convert_content_to_path(fmt, content_json):
+    """
+    Воркер пула экспорта (export_jobs.py): без Django, только конвертер.
+    Пишет результат во временный файл и возвращает его путь — байты документа
+    не гоняются между процессами; файл удаляет вызывающий.
+    """
+    with tempfile.NamedTemporaryFile(suffix=f'.{fmt}', delete=False) as out:
+        try:
+            EXPORT_WRITERS[fmt](content_json, out)
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
+    return out.name
+
+
+class _StyledParagraphs:
+    """
+    doc.add_paragraph(style=name) без повторного поиска стиля: python-docx на
+    каждый абзац перебирает все стили документа, здесь id стиля ищется
+    один раз на имя (результат тот же — pStyle с этим id).
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.style_ids = {}
+
+    def __call__(self, style_name):
+        if style_name not in self.style_ids:
+            self.style_ids[style_name] = self.doc.part.get_style_id(style_name, WD_STYLE_TYPE.PARAGRAPH)
+        paragraph = self.doc.add_paragraph()
+        paragraph._p.style = self.style_ids[style_name]
+        return paragraph
+
+
+def add_runs_to_paragraph(paragraph, runs):
+    for node, direct in runs:
+        if direct:
+            add_run_to_paragraph(paragraph, node)
 
 
 def add_run_to_paragraph(paragraph, node):
@@ -141,7 +261,17 @@ def add_run_to_paragraph(paragraph, node):
 
 def editor_json_to_pdf_bytes(content_json):
     buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=72, rightMargin=72, topMargin=72, bottomMargin=72)
+    editor_json_to_pdf_file(content_json, buffer)
+    return buffer.getvalue()
+
+
+def _pdf_markup(runs):
+    return ''.join(get_text_with_marks(node) for node, _direct in runs)
+
+
+def editor_json_to_pdf_file(content_json, out):
+    """Пишет PDF в out (файл, открытый на запись)."""
+    doc = SimpleDocTemplate(out, pagesize=A4, leftMargin=72, rightMargin=72, topMargin=72, bottomMargin=72)
     
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(name='CustomBody', parent=styles['Normal'], fontSize=12, leading=16))
@@ -153,45 +283,33 @@ def editor_json_to_pdf_bytes(content_json):
     
     if not content_json:
         doc.build(story)
-        buffer.seek(0)
-        return buffer.getvalue()
+        return
     
-    content = content_json.get('content', [])
-    
-    for block in content:
-        block_type = block.get('type', 'paragraph')
-        block_content = block.get('content', [])
+    for block in walk_content(content_json).blocks:
+        block_type = block['type']
         
         if block_type == 'heading':
-            level = block.get('attrs', {}).get('level', 1)
-            style_name = f'CustomH{min(level, 3)}'
-            text_parts = process_content_for_pdf(block_content)
-            text = ''.join(text_parts)
+            style_name = f'CustomH{min(block["level"], 3)}'
+            text = _pdf_markup(block['runs'])
             if text:
                 story.append(Paragraph(text, styles[style_name]))
                 story.append(Spacer(1, 6))
         
         elif block_type == 'paragraph':
-            text_parts = process_content_for_pdf(block_content)
-            text = ''.join(text_parts)
+            text = _pdf_markup(block['runs'])
             if text:
                 story.append(Paragraph(text, styles['CustomBody']))
                 story.append(Spacer(1, 4))
             else:
                 story.append(Spacer(1, 12))
         
-        elif block_type in ['bulletList', 'orderedList']:
+        else:
             bullet_type = 'bullet' if block_type == 'bulletList' else '1'
             items = []
-            for item in block_content:
-                if item.get('type') == 'listItem':
-                    item_content = item.get('content', [])
-                    for para in item_content:
-                        if para.get('type') == 'paragraph':
-                            text_parts = process_content_for_pdf(para.get('content', []))
-                            text = ''.join(text_parts)
-                            if text:
-                                items.append(ListItem(Paragraph(text, styles['CustomBody'])))
+            for runs in block['items']:
+                text = _pdf_markup(runs)
+                if text:
+                    items.append(ListItem(Paragraph(text, styles['CustomBody'])))
             
             if items:
                 story.append(ListFlowable(items, bulletType=bullet_type))
@@ -201,8 +319,12 @@ def editor_json_to_pdf_bytes(content_json):
         story.append(Spacer(1, 1))
     
     doc.build(story)
-    buffer.seek(0)
-    return buffer.getvalue()
+
+
+EXPORT_WRITERS = {
+    'docx': editor_json_to_docx_file,
+    'pdf': editor_json_to_pdf_file,
+}
 
 
 def docx_file_to_editor_json(file):
@@ -280,30 +402,45 @@ def docx_file_to_editor_json(file):
 def pdf_file_to_editor_json(file):
     content = []
     
-    with pdfplumber.open(file) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                paragraphs = text.split('\n')
-                for para_text in paragraphs:
-                    para_text = para_text.strip()
-                    if para_text:
-                        content.append({
-                            'type': 'paragraph',
-                            'content': [
-                                {
-                                    'type': 'text',
-                                    'text': para_text
-                                }
-                            ]
-                        })
-                    else:
-                        content.append({
-                            'type': 'paragraph',
-                            'content': []
-                        })
+    for text in iter_pdf_page_texts(file):
+        if text:
+            paragraphs = text.split('\n')
+            for para_text in paragraphs:
+                para_text = para_text.strip()
+                if para_text:
+                    content.append({
+                        'type': 'paragraph',
+                        'content': [
+                            {
+                                'type': 'text',
+                                'text': para_text
+                            }
+                        ]
+                    })
+                else:
+                    content.append({
+                        'type': 'paragraph',
+                        'content': []
+                    })
     
     return {
         'type': 'doc',
         'content': content
     }
+
+
+def iter_pdf_page_texts(file):
+    with pdfplumber.open(file) as pdf:
+        page_count = len(pdf.pages)
+        if not should_parallelize(page_count):
+            for page in pdf.pages:
+                yield page.extract_text()
+            return
+    
+    with local_path(file) as path:
+        yield from iter_page_ranges(path, page_count, extract_pdf_page_texts)
+
+
+def extract_pdf_page_texts(path, start, stop):
+    with pdfplumber.open(path) as pdf:
+        return [pdf.pages[i].extract_text() for i in range(start, stop)]
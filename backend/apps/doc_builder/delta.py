@@ -0,0 +1,275 @@
+"""
+Дельты content_json для автосохранения: RFC 6902 (JSON Patch) против
+номера ревизии проекта.
+
+Патч применяется на сервере, запись — условным UPDATE с revision=base:
+из двух правок одной ревизии пройдёт одна, вторая получит 409 и
+перечитает проект. content_text пересчитывается только для блоков
+верхнего уровня, которых коснулся патч (block_texts хранит текст каждого).
+"""
+import copy
+import re
+from typing import Any, Dict, List, Optional
+
+from django.utils import timezone
+
+from .converters import walk_content
+from .models import DocumentProject
+
+_ARRAY_INDEX_RE = re.compile(r'^(0|[1-9][0-9]*)$')
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+class RevisionConflict(Exception):
+    def __init__(self, revision: int):
+        super().__init__(f'Project is at revision {revision}.')
+        self.revision = revision
+
+
+def apply_delta(project: DocumentProject, base_revision: int, patch: List[Dict[str, Any]]) -> DocumentProject:
+    """Применяет патч к проекту ревизии base_revision и сохраняет ревизию base_revision + 1."""
+    if project.revision != base_revision:
+        raise RevisionConflict(project.revision)
+    if not patch:
+        return project
+
+    texts = _BlockTexts(project.content_json, project.block_texts)
+    content_json = project.content_json
+    for operation in patch:
+        content_json = _apply_operation(content_json, operation, texts)
+    if not isinstance(content_json, dict):
+        raise JsonPatchError('content_json must stay an object.')
+
+    block_texts = texts.result(content_json)
+    fields = {
+        'content_json': content_json,
+        'content_text': '\n'.join(text for text in block_texts if text),
+        'block_texts': block_texts,
+        'revision': base_revision + 1,
+        'updated_at': timezone.now(),
+    }
+    updated = DocumentProject.objects.filter(pk=project.pk, revision=base_revision).update(**fields)
+    if not updated:
+        raise RevisionConflict(DocumentProject.objects.filter(pk=project.pk).values_list('revision', flat=True).first())
+    for name, value in fields.items():
+        setattr(project, name, value)
+    return project
+
+
+def apply_json_patch(doc: Any, patch: List[Dict[str, Any]]) -> Any:
+    """RFC 6902 без учёта блоков; контейнеры doc меняются на месте, возвращается новый корень."""
+    for operation in patch:
+        doc = _apply_operation(doc, operation, None)
+    return doc
+
+
+# ---------- RFC 6902 ----------
+def _apply_operation(doc, operation, texts: Optional['_BlockTexts']):
+    op = operation.get('op')
+    path = _parse_pointer(operation.get('path'))
+
+    if op == 'add':
+        doc = _add(doc, path, _value(operation))
+        if texts:
+            texts.added(path)
+    elif op == 'remove':
+        if not path:
+            raise JsonPatchError('Cannot remove the document root.')
+        _remove(doc, path)
+        if texts:
+            texts.removed(path)
+    elif op == 'replace':
+        value = _value(operation)
+        if path:
+            parent, key = _parent(doc, path)
+            _child(parent, key)  # replace требует существующего значения
+            parent[_key(parent, key)] = value
+        else:
+            doc = value
+        if texts:
+            texts.replaced(path)
+    elif op == 'move':
+        from_path = _parse_pointer(operation.get('from'))
+        if len(path) > len(from_path) and path[:len(from_path)] == from_path:
+            raise JsonPatchError('Cannot move a value into one of its children.')
+        if path != from_path:
+            if not from_path:
+                raise JsonPatchError('Cannot move the document root.')
+            _resolve(doc, from_path)  # from проверяется до учёта текстов блоков
+            text = texts.text_at(from_path) if texts else None
+            value = _remove(doc, from_path)
+            if texts:
+                texts.removed(from_path)
+            doc = _add(doc, path, value)
+            if texts:
+                texts.added(path, text)
+    elif op == 'copy':
+        from_path = _parse_pointer(operation.get('from'))
+        value = copy.deepcopy(_resolve(doc, from_path))
+        text = texts.text_at(from_path) if texts else None
+        doc = _add(doc, path, value)
+        if texts:
+            texts.added(path, text)
+    elif op == 'test':
+        if not _json_equal(_resolve(doc, path), _value(operation)):
+            raise JsonPatchError(f'Test failed at {operation.get("path")!r}.')
+    else:
+        raise JsonPatchError(f'Unknown op {op!r}.')
+    return doc
+
+
+def _parse_pointer(pointer) -> List[str]:
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise JsonPatchError(f'Invalid JSON pointer {pointer!r}.')
+    if not pointer:
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _value(operation):
+    if 'value' not in operation:
+        raise JsonPatchError(f'"{operation.get("op")}" requires a value.')
+    return operation['value']
+
+
+def _resolve(doc, path: List[str]):
+    node = doc
+    for token in path:
+        node = _child(node, token)
+    return node
+
+
+def _parent(doc, path: List[str]):
+    return _resolve(doc, path[:-1]), path[-1]
+
+
+def _child(node, token: str):
+    if isinstance(node, dict):
+        if token not in node:
+            raise JsonPatchError(f'Member {token!r} not found.')
+        return node[token]
+    if isinstance(node, list):
+        return node[_index(node, token)]
+    raise JsonPatchError(f'Cannot descend into a {type(node).__name__} at {token!r}.')
+
+
+def _key(node, token: str):
+    return _index(node, token) if isinstance(node, list) else token
+
+
+def _index(items: list, token: str, allow_end: bool = False) -> int:
+    if allow_end and token == '-':
+        return len(items)
+    if not _ARRAY_INDEX_RE.match(token):
+        raise JsonPatchError(f'Invalid array index {token!r}.')
+    index = int(token)
+    if index > len(items) or (index == len(items) and not allow_end):
+        raise JsonPatchError(f'Array index {index} out of range.')
+    return index
+
+
+def _add(doc, path: List[str], value):
+    if not path:
+        return value
+    parent, token = _parent(doc, path)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, token, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[token] = value
+    else:
+        raise JsonPatchError(f'Cannot add to a {type(parent).__name__}.')
+    return doc
+
+
+def _remove(doc, path: List[str]):
+    parent, token = _parent(doc, path)
+    _child(parent, token)
+    return parent.pop(_key(parent, token))
+
+
+def _json_equal(a, b) -> bool:
+    # RFC 6902 §4.6: true не равно 1, 1 равно 1.0
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[key], b[key]) for key in a)
+    return a == b
+
+
+# ---------- plain text по блокам ----------
+class _BlockTexts:
+    """
+    Повторяет операции патча над списком текстов блоков (/content/N):
+    вставка/удаление/перенос блока сдвигают список, правка внутри блока
+    помечает его текст к пересчёту (None). Замена всего content или корня —
+    полный пересчёт.
+    """
+
+    def __init__(self, content_json, block_texts):
+        content = content_json.get('content') if isinstance(content_json, dict) else None
+        synced = isinstance(content, list) and isinstance(block_texts, list) and len(block_texts) == len(content)
+        self.texts: Optional[list] = list(block_texts) if synced else None
+
+    def __bool__(self):
+        return self.texts is not None
+
+    def text_at(self, path: List[str]) -> Optional[str]:
+        index = self._block_index(path)
+        return self.texts[index] if index is not None and len(path) == 2 else None
+
+    def added(self, path: List[str], text: Optional[str] = None) -> None:
+        if self._is_block(path) and path[1] == '-':
+            self.texts.append(text)
+        elif self._is_block(path) and self._block_index(path, allow_end=True) is not None:
+            self.texts.insert(int(path[1]), text)
+        else:
+            self._touched(path)
+
+    def removed(self, path: List[str]) -> None:
+        if self._is_block(path) and self._block_index(path) is not None:
+            del self.texts[int(path[1])]
+        else:
+            self._touched(path)
+
+    def replaced(self, path: List[str]) -> None:
+        self._touched(path)
+
+    def result(self, content_json) -> List[str]:
+        content = content_json.get('content')
+        if self.texts is None or not isinstance(content, list) or len(self.texts) != len(content):
+            return walk_content(content_json, collect_blocks=False).block_texts
+        return [
+            walk_content({'content': [block]}, collect_blocks=False).block_texts[0] if text is None else text
+            for block, text in zip(content, self.texts)
+        ]
+
+    @staticmethod
+    def _is_block(path: List[str]) -> bool:
+        return len(path) == 2 and path[0] == 'content'
+
+    def _block_index(self, path: List[str], allow_end: bool = False) -> Optional[int]:
+        """Номер блока верхнего уровня для /content/N[/...]; None — путь не про блок."""
+        if self.texts is None or len(path) < 2 or path[0] != 'content' or not _ARRAY_INDEX_RE.match(path[1]):
+            return None
+        index = int(path[1])
+        limit = len(self.texts) + 1 if allow_end else len(self.texts)
+        return index if index < limit else None
+
+    def _touched(self, path: List[str]) -> None:
+        if self.texts is None:
+            return
+        index = self._block_index(path)
+        if index is not None:
+            self.texts[index] = None  # правка внутри блока или замена блока целиком
+        elif path in ([], ['content']) or (path and path[0] == 'content'):
+            # заменён весь документ/список блоков или путь не сошёлся со списком
+            self.texts = None
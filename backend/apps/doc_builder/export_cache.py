@@ -0,0 +1,116 @@
+"""
+Кэш экспорта проектов в DOCX/PDF.
+
+Ключ — sha256 от content_json, названия, версии конвертеров и формата.
+Два уровня: LRU в памяти процесса (только небольшие файлы) и сохранённые
+DocumentFile с тем же content_hash (общие для всех воркеров, отдаются
+потоком из хранилища). Правка проекта меняет хэш, так что старые файлы
+просто перестают совпадать; память чистится явно.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import IO, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import File
+
+from apps.common.caching import LRUCache
+
+from .converters import CONVERTER_VERSION, EXPORT_WRITERS
+from .models import DocumentFile
+
+memory: Optional[LRUCache] = None
+if getattr(settings, 'EXPORT_CACHE_ENABLED', True):
+    memory = LRUCache(
+        max_entries=10000,
+        max_weight=getattr(settings, 'EXPORT_CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024),
+        ttl=getattr(settings, 'EXPORT_CACHE_MEMORY_TTL', 3600),
+        weigh=len,
+    )
+
+
+def export_content_hash(project, fmt: str) -> str:
+    canonical = json.dumps(project.content_json or {}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(
+        '\x00'.join([CONVERTER_VERSION, fmt, project.title, canonical]).encode('utf-8')
+    ).hexdigest()
+
+
+def open_export(project, fmt: str) -> Tuple[IO[bytes], str]:
+    """
+    Готовый файл проекта в формате fmt (открыт на чтение, позиция 0) и его
+    content_hash; конвертер — только при промахе. Конвертер пишет в
+    SpooledTemporaryFile: до EXPORT_SPOOL_MAX_MEMORY байт в памяти, дальше на диске.
+    """
+    f, content_hash = open_cached_export(project, fmt)
+    if f is None:
+        f = tempfile.SpooledTemporaryFile(max_size=_spool_max_memory())
+        try:
+            EXPORT_WRITERS[fmt](project.content_json, f)
+        except BaseException:
+            f.close()
+            raise
+        f.seek(0)
+        remember_export(project, content_hash, f)
+    return f, content_hash
+
+
+def open_cached_export(project, fmt: str) -> Tuple[Optional[IO[bytes]], str]:
+    """Как open_export, но без конвертации: (None, content_hash) при промахе."""
+    content_hash = export_content_hash(project, fmt)
+    if memory is not None:
+        data = memory.get((project.pk, content_hash))
+        if data is not None:
+            return io.BytesIO(data), content_hash
+    return _open_saved(project, fmt, content_hash), content_hash
+
+
+def remember_export(project, content_hash: str, f: IO[bytes]) -> None:
+    """В память попадают только небольшие файлы (не больше EXPORT_SPOOL_MAX_MEMORY)."""
+    if memory is None:
+        return
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if size <= _spool_max_memory():
+        memory.set((project.pk, content_hash), f.read())
+        f.seek(0)
+
+
+def save_export(project, fmt: str, f: IO[bytes], content_hash: str, filename: str) -> DocumentFile:
+    """
+    save_to_media: копирует f в хранилище по частям и возвращает позицию в 0,
+    чтобы тот же файл можно было отдать в ответ. Тот же экспорт второй раз
+    не сохраняется — возвращается уже сохранённый.
+    """
+    doc_file = _saved_files(project, fmt, content_hash).first()
+    if doc_file is not None:
+        return doc_file
+    doc_file = DocumentFile.objects.create(project=project, file_type=fmt, content_hash=content_hash)
+    doc_file.file.save(filename, File(f))
+    f.seek(0)
+    return doc_file
+
+
+def invalidate_project_exports(project_id) -> None:
+    if memory is not None:
+        memory.discard_where(lambda key: key[0] == project_id)
+
+
+def _saved_files(project, fmt: str, content_hash: str):
+    return DocumentFile.objects.filter(project=project, file_type=fmt, content_hash=content_hash)
+
+
+def _open_saved(project, fmt: str, content_hash: str) -> Optional[IO[bytes]]:
+    for doc_file in _saved_files(project, fmt, content_hash):
+        try:
+            return doc_file.file.storage.open(doc_file.file.name, 'rb')
+        except (OSError, ValueError):
+            continue  # файл удалён из хранилища — пробуем следующий или конвертируем
+    return None
+
+
+def _spool_max_memory() -> int:
+    return getattr(settings, 'EXPORT_SPOOL_MAX_MEMORY', 1024 * 1024)
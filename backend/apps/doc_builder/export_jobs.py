@@ -0,0 +1,128 @@
+"""
+Фоновый экспорт проектов в DOCX/PDF.
+
+Конвертация (ReportLab/python-docx) идёт в локальном пуле процессов и не
+держит поток веб-воркера. Процесс пула получает только content_json и
+пишет результат во временный файл; DocumentFile из этого файла и статус
+ExportJob записывает done-callback в родительском процессе. Пул живёт в памяти процесса:
+задания, не завершённые до его перезапуска, через EXPORT_JOB_TIMEOUT
+помечаются FAILED (fail_stale_jobs).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .converters import convert_content_to_path
+from .export_cache import open_cached_export, remember_export, save_export
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: WSGI-процесс многопоточный, fork унаследовал бы чужие блокировки
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_JOB_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def export_filename(project, fmt: str) -> str:
+    safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
+    return f"{safe_title or 'document'}.{fmt}"
+
+
+def enqueue_export(project, fmt: str) -> ExportJob:
+    """Ставит экспорт в пул; готовый (кэшированный) результат возвращается сразу со статусом DONE."""
+    cached, content_hash = open_cached_export(project, fmt)
+    job = ExportJob.objects.create(project=project, file_type=fmt, content_hash=content_hash)
+    if cached is not None:
+        with cached:
+            _complete(job.pk, project, fmt, content_hash, cached)
+        job.refresh_from_db()
+        return job
+
+    try:
+        future = _get_executor().submit(convert_content_to_path, fmt, project.content_json)
+    except BrokenProcessPool:
+        # упавший процесс ломает пул целиком — поднимаем новый
+        _reset_executor()
+        future = _get_executor().submit(convert_content_to_path, fmt, project.content_json)
+    caller = threading.get_ident()
+    future.add_done_callback(lambda f: _on_converted(f, job.pk, project, fmt, content_hash, caller))
+    return job
+
+
+def fail_stale_jobs(jobs=None) -> int:
+    """
+    Задания, потерянные вместе с пулом (перезапуск процесса), не висят в QUEUED вечно.
+    jobs — queryset для проверки (по умолчанию все задания).
+    """
+    timeout = getattr(settings, 'EXPORT_JOB_TIMEOUT', 600)
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    jobs = ExportJob.objects.all() if jobs is None else jobs
+    return jobs.filter(status=ExportJob.STATUS_QUEUED, created_at__lt=deadline).update(
+        status=ExportJob.STATUS_FAILED, error='Export timed out.', finished_at=timezone.now()
+    )
+
+
+def _on_converted(future: Future, job_id: int, project, fmt: str, content_hash: str, caller: int) -> None:
+    # обычно вызывается в служебном потоке пула — своё соединение с БД закрываем сами;
+    # если future уже готов, callback идёт в потоке запроса, и его соединение не трогаем
+    try:
+        try:
+            path = future.result()
+        except Exception as e:
+            logger.exception('Export job %s failed', job_id)
+            _finish(job_id, ExportJob.STATUS_FAILED, error=f'Failed to generate {fmt.upper()}: {str(e)}')
+            if isinstance(e, BrokenProcessPool):
+                _reset_executor()
+            return
+        try:
+            with open(path, 'rb') as f:
+                remember_export(project, content_hash, f)
+                _complete(job_id, project, fmt, content_hash, f)
+        finally:
+            os.unlink(path)
+    except Exception:
+        logger.exception('Export job %s: failed to store the result', job_id)
+        _finish(job_id, ExportJob.STATUS_FAILED, error='Failed to store the exported file.')
+    finally:
+        if threading.get_ident() != caller:
+            connection.close()
+
+
+def _complete(job_id: int, project, fmt: str, content_hash: str, f) -> None:
+    doc_file = save_export(project, fmt, f, content_hash, export_filename(project, fmt))
+    _finish(job_id, ExportJob.STATUS_DONE, result=doc_file)
+
+
+def _finish(job_id: int, status: str, **fields) -> None:
+    # только из QUEUED: задание, уже снятое по таймауту (fail_stale_jobs), не воскресает
+    ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_QUEUED).update(
+        status=status, finished_at=timezone.now(), **fields
+    )
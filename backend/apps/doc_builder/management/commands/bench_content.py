@@ -0,0 +1,113 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.doc_builder.converters import (
+    editor_json_to_docx_bytes,
+    editor_json_to_pdf_bytes,
+    editor_json_to_plain_text,
+    walk_content,
+)
+from apps.doc_builder.models import DocumentProject
+
+
+def recursive_plain_text(content_json):
+    """Прежний рекурсивный editor_json_to_plain_text — точка отсчёта для шага text."""
+    def extract(node):
+        if isinstance(node, str):
+            return node
+        if isinstance(node, dict):
+            if node.get('type') == 'text':
+                return node.get('text', '')
+            return ''.join(extract(child) for child in node.get('content', []))
+        if isinstance(node, list):
+            return ''.join(extract(child) for child in node)
+        return ''
+
+    return '\n'.join(text for text in map(extract, content_json.get('content', [])) if text)
+
+
+STEPS = {
+    'walk': walk_content,
+    'text': editor_json_to_plain_text,
+    'text-recursive': recursive_plain_text,
+    'docx': editor_json_to_docx_bytes,
+    'pdf': editor_json_to_pdf_bytes,
+}
+
+
+def synthetic_content(blocks):
+    """Документ из blocks блоков: заголовки, абзацы с разметкой и вложенные списки."""
+    content = []
+    for i in range(blocks):
+        kind = i % 10
+        if kind == 0:
+            content.append({'type': 'heading', 'attrs': {'level': 1 + i % 3},
+                            'content': [{'type': 'text', 'text': f'Section {i}'}]})
+        elif kind in (4, 8):
+            inner = {'type': 'bulletList', 'content': [
+                {'type': 'listItem', 'content': [
+                    {'type': 'paragraph', 'content': [{'type': 'text', 'text': f'Nested item {i}.{j}'}]},
+                ]} for j in range(2)
+            ]}
+            content.append({'type': 'bulletList' if kind == 4 else 'orderedList', 'content': [
+                {'type': 'listItem', 'content': [
+                    {'type': 'paragraph', 'content': [{'type': 'text', 'text': f'Item {i}.{j} of the list'}]},
+                    inner,
+                ]} for j in range(3)
+            ]})
+        else:
+            content.append({'type': 'paragraph', 'content': [
+                {'type': 'text', 'text': f'Paragraph {i} with some plain words, '},
+                {'type': 'text', 'text': 'bold', 'marks': [{'type': 'bold'}]},
+                {'type': 'text', 'text': ' and ', 'marks': []},
+                {'type': 'text', 'text': 'italic underline', 'marks': [{'type': 'italic'}, {'type': 'underline'}]},
+                {'type': 'text', 'text': ' text.'},
+            ]})
+    return {'type': 'doc', 'content': content}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark content_json conversions (walk / plain text / DOCX / PDF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blocks', type=int, default=10000, help='Blocks in the synthetic document')
+        parser.add_argument('--project', type=int, help='Benchmark an existing project instead')
+        parser.add_argument('--file', help='Benchmark content_json from a .json/.docflow.json file instead')
+        parser.add_argument('--step', action='append', choices=list(STEPS),
+                            help='Conversion to benchmark (repeatable; default: all)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per step; the best one is reported')
+
+    def handle(self, *args, **options):
+        content_json = self._content(options)
+        repeat = max(1, options['repeat'])
+
+        stats = walk_content(content_json).stats()
+        self.stdout.write(f'blocks: {stats["blocks"]}, words: {stats["words"]}, characters: {stats["characters"]}')
+        self.stdout.write(f'{"step":<14} {"best, s":>9} {"blocks/s":>11}')
+        for step in options['step'] or list(STEPS):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                STEPS[step](content_json)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            rate = stats['blocks'] / best if best else 0
+            self.stdout.write(f'{step:<14} {best:>9.4f} {rate:>11.0f}')
+
+    @staticmethod
+    def _content(options):
+        if options['project']:
+            try:
+                return DocumentProject.objects.get(pk=options['project']).content_json
+            except DocumentProject.DoesNotExist:
+                raise CommandError(f'Project not found: {options["project"]}')
+        if options['file']:
+            try:
+                with open(options['file'], encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["file"]}: {e}')
+            return data.get('content_json', data)
+        return synthetic_content(options['blocks'])
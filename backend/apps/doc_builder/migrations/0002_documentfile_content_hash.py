@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc_builder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
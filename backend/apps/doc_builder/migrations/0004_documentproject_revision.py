@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc_builder', '0003_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentproject',
+            name='block_texts',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='documentproject',
+            name='revision',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -7,6 +7,11 @@ class DocumentProject(models.Model):
     schema_version = models.IntegerField(default=1)
     content_json = models.JSONField(default=dict, blank=True)
     content_text = models.TextField(blank=True, default='')
+    # растёт при каждом изменении content_json — база для дельт (delta.py)
+    revision = models.IntegerField(default=0)
+    # plain text каждого блока верхнего уровня: content_text после дельты
+    # пересчитывается только для затронутых блоков
+    block_texts = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -31,6 +36,8 @@ class DocumentFile(models.Model):
     )
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
     file = models.FileField(upload_to='doc_builder/')
+    # export_cache.export_content_hash — по нему повторный экспорт берётся из файла
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -38,3 +45,33 @@ class DocumentFile(models.Model):
 
     def __str__(self):
         return f"{self.project.title} - {self.file_type}"
+
+
+class ExportJob(models.Model):
+    """
+    Фоновый экспорт (POST .../export/{fmt}/?async=1): конвертация идёт в
+    локальном пуле процессов (export_jobs.py), результат — DocumentFile.
+    """
+    STATUS_QUEUED = 'QUEUED'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    project = models.ForeignKey(DocumentProject, on_delete=models.CASCADE, related_name='export_jobs')
+    file_type = models.CharField(max_length=10, choices=DocumentFile.FILE_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    result = models.ForeignKey(DocumentFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'ExportJob {self.pk} ({self.file_type}, {self.status})'
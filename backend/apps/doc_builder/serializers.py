@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DocumentProject, DocumentFile
+from .models import DocumentProject, DocumentFile, ExportJob
 
 
 class DocumentFileSerializer(serializers.ModelSerializer):
@@ -15,10 +15,10 @@ class DocumentProjectSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentProject
         fields = [
-            'id', 'owner_id', 'title', 'schema_version',
+            'id', 'owner_id', 'title', 'schema_version', 'revision',
             'content_json', 'content_text', 'created_at', 'updated_at', 'files'
         ]
-        read_only_fields = ['id', 'owner_id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'owner_id', 'revision', 'created_at', 'updated_at']
 
 
 class DocumentProjectListSerializer(serializers.ModelSerializer):
@@ -39,6 +39,11 @@ class DocumentProjectUpdateSerializer(serializers.ModelSerializer):
         fields = ['title', 'content_json', 'content_text']
 
 
+class DocumentDeltaSerializer(serializers.Serializer):
+    base_revision = serializers.IntegerField(min_value=0)
+    patch = serializers.ListField(child=serializers.DictField(), allow_empty=True)
+
+
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
     
@@ -72,3 +77,17 @@ class JsonUploadSerializer(FileUploadSerializer):
         if not (ext.endswith('.json') or ext.endswith('.docflow.json')):
             raise serializers.ValidationError('Only .json or .docflow.json files are allowed.')
         return value
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'project', 'file_type', 'status', 'error', 'file', 'created_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_file(self, obj):
+        if obj.status != ExportJob.STATUS_DONE or obj.result is None:
+            return None
+        return DocumentFileSerializer(obj.result, context=self.context).data
@@ -0,0 +1,275 @@
+import io
+import json
+import re
+import sys
+from datetime import timedelta
+
+import pdfplumber
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from docx import Document
+
+from .converters import (
+    editor_json_to_docx_bytes,
+    editor_json_to_pdf_bytes,
+    editor_json_to_plain_text,
+    walk_content,
+)
+from .delta import JsonPatchError, apply_json_patch
+from .export_jobs import _finish
+from .management.commands.bench_content import recursive_plain_text, synthetic_content
+from .models import DocumentProject, ExportJob
+
+
+def paragraph(text):
+    return {'type': 'paragraph', 'content': [{'type': 'text', 'text': text}]}
+
+
+def sample_content():
+    return {'type': 'doc', 'content': [
+        paragraph('first'),
+        {'type': 'heading', 'attrs': {'level': 1}, 'content': [{'type': 'text', 'text': 'Title'}]},
+        {'type': 'bulletList', 'content': [{'type': 'listItem', 'content': [paragraph('item')]}]},
+        paragraph('last'),
+    ]}
+
+
+def text(value, *marks):
+    node = {'type': 'text', 'text': value}
+    if marks:
+        node['marks'] = [{'type': mark} for mark in marks]
+    return node
+
+
+def item(*content):
+    return {'type': 'listItem', 'content': list(content)}
+
+
+NESTED_LISTS = {'type': 'doc', 'content': [
+    {'type': 'heading', 'attrs': {'level': 2}, 'content': [text('Title')]},
+    {'type': 'paragraph', 'content': [text('Plain '), text('bold', 'bold'), text(' and '),
+                                      text('both', 'italic', 'underline')]},
+    {'type': 'bulletList', 'content': [
+        item({'type': 'paragraph', 'content': [text('one')]},
+             {'type': 'orderedList', 'content': [
+                 item({'type': 'paragraph', 'content': [text('one.a'), text('!', 'bold')]}),
+                 item(paragraph('one.b')),
+             ]}),
+        item({'type': 'paragraph', 'content': [text('two', 'italic')]}),
+    ]},
+    {'type': 'orderedList', 'content': [
+        item(paragraph('first')),
+        item({'type': 'paragraph', 'content': [{'type': 'hardBreak'}, text('second')]}),
+    ]},
+    {'type': 'paragraph', 'content': [{'type': 'mention', 'content': [text('nested inline')]}, text(' tail')]},
+]}
+
+
+class ContentWalkTests(SimpleTestCase):
+    """Ожидаемые значения — вывод прежних рекурсивных конвертеров на том же документе."""
+
+    def test_plain_text(self):
+        expected = 'Title\nPlain bold and both\noneone.a!one.btwo\nfirstsecond\nnested inline tail'
+        self.assertEqual(editor_json_to_plain_text(NESTED_LISTS), expected)
+        self.assertEqual(walk_content(NESTED_LISTS).text, expected)
+        self.assertEqual(recursive_plain_text(NESTED_LISTS), expected)
+
+        content = synthetic_content(200)
+        self.assertEqual(editor_json_to_plain_text(content), recursive_plain_text(content))
+
+    def test_docx(self):
+        document = Document(io.BytesIO(editor_json_to_docx_bytes(NESTED_LISTS)))
+        paragraphs = [
+            (p.style.name, [(r.text, r.bold, r.italic, r.underline) for r in p.runs]) for p in document.paragraphs
+        ]
+        self.assertEqual(paragraphs, [
+            ('Heading 2', [('Title', None, None, None)]),
+            ('Normal', [('Plain ', None, None, None), ('bold', True, None, None),
+                        (' and ', None, None, None), ('both', None, True, True)]),
+            # вложенный список в DOCX не попадает — только абзацы прямо в listItem
+            ('List Bullet', [('one', None, None, None)]),
+            ('List Bullet', [('two', None, True, None)]),
+            ('List Number', [('first', None, None, None)]),
+            ('List Number', [('second', None, None, None)]),
+            ('Normal', [(' tail', None, None, None)]),
+        ])
+
+    def test_pdf(self):
+        with pdfplumber.open(io.BytesIO(editor_json_to_pdf_bytes(NESTED_LISTS))) as pdf:
+            lines = '\n'.join(page.extract_text() for page in pdf.pages).splitlines()
+        # маркеры списков (• / 1.) отбрасываем
+        lines = [re.sub(r'^(\(cid:\d+\)|\d+)\s+', '', line) for line in lines]
+        self.assertEqual(lines, ['Title', 'Plain bold and both', 'one', 'two', 'first', 'second', 'nested inline tail'])
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        node = paragraph('deepest')
+        for _ in range(depth):
+            node = {'type': 'bulletList', 'content': [item(node)]}
+        content = {'type': 'doc', 'content': [node, paragraph('after')]}
+
+        self.assertEqual(editor_json_to_plain_text(content), 'deepest\nafter')
+        self.assertEqual(walk_content(content).text, 'deepest\nafter')
+        document = Document(io.BytesIO(editor_json_to_docx_bytes(content)))
+        self.assertEqual([p.text for p in document.paragraphs], ['after'])
+        self.assertTrue(editor_json_to_pdf_bytes(content).startswith(b'%PDF'))
+        with self.assertRaises(RecursionError):
+            recursive_plain_text(content)
+
+
+class JsonPatchTests(SimpleTestCase):
+    def test_operations(self):
+        doc = {'foo': ['bar', 'baz'], 'obj': {'a': 1}}
+        doc = apply_json_patch(doc, [
+            {'op': 'add', 'path': '/foo/1', 'value': 'qux'},
+            {'op': 'add', 'path': '/foo/-', 'value': 'end'},
+            {'op': 'remove', 'path': '/foo/0'},
+            {'op': 'replace', 'path': '/obj/a', 'value': 2},
+            {'op': 'copy', 'from': '/obj', 'path': '/copy'},
+            {'op': 'move', 'from': '/foo/0', 'path': '/moved'},
+        ])
+        self.assertEqual(doc, {'foo': ['baz', 'end'], 'obj': {'a': 2}, 'copy': {'a': 2}, 'moved': 'qux'})
+
+        doc['copy']['a'] = 3
+        self.assertEqual(doc['obj'], {'a': 2})  # copy не делит объект с источником
+
+    def test_pointer_escapes(self):
+        doc = apply_json_patch({'a/b': 1, 'm~n': 2}, [
+            {'op': 'replace', 'path': '/a~1b', 'value': 10},
+            {'op': 'remove', 'path': '/m~0n'},
+        ])
+        self.assertEqual(doc, {'a/b': 10})
+
+    def test_replace_root(self):
+        self.assertEqual(apply_json_patch({'a': 1}, [{'op': 'replace', 'path': '', 'value': {'b': 2}}]), {'b': 2})
+
+    def test_test_op(self):
+        doc = {'n': 1, 'flag': True, 'items': [1, {'x': 'y'}]}
+        apply_json_patch(doc, [
+            {'op': 'test', 'path': '/n', 'value': 1.0},
+            {'op': 'test', 'path': '/flag', 'value': True},
+            {'op': 'test', 'path': '/items', 'value': [1, {'x': 'y'}]},
+        ])
+        for value in (True, '1', 2):
+            with self.subTest(value=value), self.assertRaises(JsonPatchError):
+                apply_json_patch(doc, [{'op': 'test', 'path': '/n', 'value': value}])
+
+    def test_invalid(self):
+        doc = {'a': 1, 'list': [1, 2]}
+        for operation in (
+            {'op': 'add', 'path': '/missing/0', 'value': 1},
+            {'op': 'add', 'path': '/list/01', 'value': 1},
+            {'op': 'add', 'path': '/list/3', 'value': 1},
+            {'op': 'add', 'path': 'list', 'value': 1},
+            {'op': 'add', 'path': '/a'},
+            {'op': 'remove', 'path': '/list/-'},
+            {'op': 'remove', 'path': ''},
+            {'op': 'replace', 'path': '/b', 'value': 1},
+            {'op': 'move', 'from': '/list', 'path': '/list/0'},
+            {'op': 'move', 'from': '/list/9', 'path': '/b'},
+            {'op': 'copy', 'from': '/b', 'path': '/c'},
+            {'op': 'unknown', 'path': '/a'},
+        ):
+            with self.subTest(operation=operation), self.assertRaises(JsonPatchError):
+                apply_json_patch(doc, [operation])
+
+
+class ProjectDeltaTests(TestCase):
+    def setUp(self):
+        response = self.post('/api/doc-builder/projects/', {'title': 'Doc', 'content_json': sample_content()})
+        self.project_id = response.json()['id']
+        self.url = f'/api/doc-builder/projects/{self.project_id}/delta/'
+
+    def post(self, url, data):
+        return self.client.post(url, data=json.dumps(data), content_type='application/json')
+
+    def delta(self, base_revision, patch):
+        return self.post(self.url, {'base_revision': base_revision, 'patch': patch})
+
+    def assertTextsMatchFullWalk(self):
+        project = DocumentProject.objects.get(pk=self.project_id)
+        walk = walk_content(project.content_json, collect_blocks=False)
+        self.assertEqual(project.block_texts, walk.block_texts)
+        self.assertEqual(project.content_text, walk.text)
+        return project
+
+    def test_revision_and_conflict(self):
+        response = self.delta(0, [{'op': 'replace', 'path': '/content/0/content/0/text', 'value': 'changed'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['revision'], 1)
+        self.assertEqual(self.assertTextsMatchFullWalk().content_text, 'changed\nTitle\nitem\nlast')
+
+        stale = self.delta(0, [{'op': 'remove', 'path': '/content/0'}])
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()['revision'], 1)
+        self.assertEqual(len(DocumentProject.objects.get(pk=self.project_id).content_json['content']), 4)
+
+        empty = self.delta(1, [])
+        self.assertEqual((empty.status_code, empty.json()['revision']), (200, 1))
+
+    def test_full_patch_bumps_revision(self):
+        response = self.client.patch(f'/api/doc-builder/projects/{self.project_id}/',
+                                     data=json.dumps({'content_json': sample_content()}),
+                                     content_type='application/json')
+        self.assertEqual(response.json()['revision'], 1)
+        self.assertEqual(self.delta(0, []).status_code, 409)
+        self.assertTextsMatchFullWalk()
+
+    def test_move_add_remove_blocks(self):
+        self.assertEqual(self.delta(0, [{'op': 'test', 'path': '/type', 'value': 'doc'}]).status_code, 200)
+        response = self.delta(1, [
+            {'op': 'move', 'from': '/content/0', 'path': '/content/-'},
+            {'op': 'add', 'path': '/content/1', 'value': paragraph('added')},
+            {'op': 'copy', 'from': '/content/0', 'path': '/content/0'},
+            {'op': 'remove', 'path': '/content/4'},
+            {'op': 'add', 'path': '/content/3/content/0/content/-', 'value': paragraph('nested')},
+            {'op': 'replace', 'path': '/content/2', 'value': paragraph('replaced')},
+        ])
+        self.assertEqual(response.status_code, 200, response.content)
+        project = self.assertTextsMatchFullWalk()
+        self.assertEqual(project.content_text, 'Title\nTitle\nreplaced\nitemnested\nfirst')
+
+        response = self.delta(2, [{'op': 'replace', 'path': '/content', 'value': [paragraph('only')]}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.assertTextsMatchFullWalk().content_text, 'only')
+
+    def test_invalid_patch(self):
+        # первая дельта заполняет block_texts — дальше тексты блоков ведутся по операциям
+        self.assertEqual(self.delta(0, [{'op': 'test', 'path': '/type', 'value': 'doc'}]).status_code, 200)
+        for operation in (
+            {'op': 'move', 'from': '/content/99', 'path': '/content/0'},
+            {'op': 'move', 'from': '/content/-', 'path': '/content/0'},
+            {'op': 'move', 'from': '/content/x', 'path': '/content/0'},
+            {'op': 'copy', 'from': '/content/99', 'path': '/content/0'},
+            {'op': 'remove', 'path': '/content/4'},
+            {'op': 'replace', 'path': '', 'value': []},
+            {'op': 'test', 'path': '/content/0/type', 'value': 'heading'},
+        ):
+            with self.subTest(operation=operation):
+                response = self.delta(1, [operation])
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid patch', response.json()['error'])
+        self.assertEqual(DocumentProject.objects.get(pk=self.project_id).revision, 1)
+
+
+@override_settings(EXPORT_JOB_TIMEOUT=60)
+class ExportJobTimeoutTests(TestCase):
+    def setUp(self):
+        project = DocumentProject.objects.create(owner_id=1, title='Doc', content_json=sample_content())
+        self.stale, self.other = [ExportJob.objects.create(project=project, file_type='pdf') for _ in range(2)]
+        ExportJob.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+
+    def test_poll_fails_only_the_requested_job(self):
+        response = self.client.get(f'/api/doc-builder/export-jobs/{self.stale.pk}/')
+
+        self.assertEqual(response.json()['status'], ExportJob.STATUS_FAILED)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.status, ExportJob.STATUS_QUEUED)
+
+    def test_late_result_does_not_override_timeout(self):
+        self.client.get(f'/api/doc-builder/export-jobs/{self.stale.pk}/')
+        _finish(self.stale.pk, ExportJob.STATUS_DONE)
+
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.status, ExportJob.STATUS_FAILED)
+        self.assertEqual(self.stale.error, 'Export timed out.')
@@ -2,10 +2,13 @@ from django.urls import path
 from .views import (
     ProjectListCreateView,
     ProjectDetailView,
+    ProjectDeltaView,
     ExportJsonView,
     ImportJsonView,
     ExportDocxView,
     ExportPdfView,
+    ExportJobDetailView,
+    ExportJobDownloadView,
     ImportDocxView,
     ImportPdfView,
 )
@@ -13,9 +16,12 @@ from .views import (
 urlpatterns = [
     path('projects/', ProjectListCreateView.as_view(), name='project-list-create'),
     path('projects/<int:pk>/', ProjectDetailView.as_view(), name='project-detail'),
+    path('projects/<int:pk>/delta/', ProjectDeltaView.as_view(), name='project-delta'),
     path('projects/<int:pk>/export/json/', ExportJsonView.as_view(), name='export-json'),
     path('projects/<int:pk>/export/docx/', ExportDocxView.as_view(), name='export-docx'),
     path('projects/<int:pk>/export/pdf/', ExportPdfView.as_view(), name='export-pdf'),
+    path('export-jobs/<int:pk>/', ExportJobDetailView.as_view(), name='export-job-detail'),
+    path('export-jobs/<int:pk>/download/', ExportJobDownloadView.as_view(), name='export-job-download'),
     path('import/json/', ImportJsonView.as_view(), name='import-json'),
     path('import/docx/', ImportDocxView.as_view(), name='import-docx'),
     path('import/pdf/', ImportPdfView.as_view(), name='import-pdf'),
@@ -1,29 +1,44 @@
 import json
 import os
+from django.db.models import F
 from django.http import HttpResponse, FileResponse
-from django.core.files.base import ContentFile
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from .models import DocumentProject, DocumentFile
+from .models import DocumentProject, ExportJob
 from .serializers import (
     DocumentProjectSerializer,
     DocumentProjectListSerializer,
     DocumentProjectCreateSerializer,
     DocumentProjectUpdateSerializer,
+    DocumentDeltaSerializer,
     DocxUploadSerializer,
     PdfUploadSerializer,
     JsonUploadSerializer,
+    ExportJobSerializer,
 )
 from .converters import (
     normalize_owner_id,
     editor_json_to_plain_text,
-    editor_json_to_docx_bytes,
-    editor_json_to_pdf_bytes,
+    walk_content,
     docx_file_to_editor_json,
     pdf_file_to_editor_json,
 )
+from .delta import JsonPatchError, RevisionConflict, apply_delta
+from .export_cache import invalidate_project_exports, open_export, save_export
+from .export_jobs import enqueue_export, fail_stale_jobs
+
+EXPORT_CONTENT_TYPES = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+}
+
+
+def _async_export_response(project, fmt):
+    """?async=1 — конвертация в пуле процессов, клиент опрашивает /export-jobs/{id}/."""
+    job = enqueue_export(project, fmt)
+    return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
 class ProjectListCreateView(APIView):
@@ -77,9 +92,16 @@ class ProjectDetailView(APIView):
                 setattr(project, attr, value)
             
             if 'content_json' in serializer.validated_data:
-                project.content_text = editor_json_to_plain_text(project.content_json)
+                walk = walk_content(project.content_json, collect_blocks=False)
+                project.content_text = walk.text
+                project.block_texts = walk.block_texts
+                # полная замена тоже новая ревизия — дельты от старой получат 409
+                project.revision = F('revision') + 1
             
             project.save()
+            project.refresh_from_db(fields=['revision'])
+            if 'content_json' in serializer.validated_data or 'title' in serializer.validated_data:
+                invalidate_project_exports(project.pk)
             return Response(DocumentProjectSerializer(project).data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -89,10 +111,42 @@ class ProjectDetailView(APIView):
         if not project:
             return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        project_id = project.pk
         project.delete()
+        invalidate_project_exports(project_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ProjectDeltaView(APIView):
+    """Автосохранение дельтой: RFC 6902 патч к content_json против base_revision."""
+
+    def post(self, request, pk):
+        owner_id = normalize_owner_id(request)
+        try:
+            project = DocumentProject.objects.get(pk=pk, owner_id=owner_id)
+        except DocumentProject.DoesNotExist:
+            return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = DocumentDeltaSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        patch = serializer.validated_data['patch']
+        try:
+            project = apply_delta(project, serializer.validated_data['base_revision'], patch)
+        except RevisionConflict as e:
+            return Response(
+                {'error': 'Project has been modified since base_revision.', 'revision': e.revision},
+                status=status.HTTP_409_CONFLICT
+            )
+        except JsonPatchError as e:
+            return Response({'error': f'Invalid patch: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if patch:
+            invalidate_project_exports(project.pk)
+        return Response({'id': project.pk, 'revision': project.revision, 'updated_at': project.updated_at})
+
+
 class ExportJsonView(APIView):
     def get(self, request, pk):
         owner_id = normalize_owner_id(request)
@@ -154,32 +208,25 @@ class ExportDocxView(APIView):
         except DocumentProject.DoesNotExist:
             return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        if request.query_params.get('async') in ('1', 'true'):
+            return _async_export_response(project, 'docx')
+        
         try:
-            docx_bytes = editor_json_to_docx_bytes(project.content_json)
+            export_file, content_hash = open_export(project, 'docx')
         except Exception as e:
             return Response({'error': f'Failed to generate DOCX: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+        safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
+        filename = f"{safe_title or 'document'}.docx"
+        
         save_to_media = request.data.get('save_to_media', False)
         
         if save_to_media:
-            safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
-            filename = f"{safe_title or 'document'}.docx"
-            
-            doc_file = DocumentFile.objects.create(
-                project=project,
-                file_type='docx',
-            )
-            doc_file.file.save(filename, ContentFile(docx_bytes))
-            doc_file.save()
+            save_export(project, 'docx', export_file, content_hash, filename)
         
-        response = HttpResponse(
-            docx_bytes,
-            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
-        safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
-        filename = f"{safe_title or 'document'}.docx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        # тот же файл уходит в ответ потоком, FileResponse закроет его сам
+        return FileResponse(export_file, as_attachment=True, filename=filename,
+                            content_type=EXPORT_CONTENT_TYPES['docx'])
 
 
 class ExportPdfView(APIView):
@@ -190,29 +237,63 @@ class ExportPdfView(APIView):
         except DocumentProject.DoesNotExist:
             return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        if request.query_params.get('async') in ('1', 'true'):
+            return _async_export_response(project, 'pdf')
+        
         try:
-            pdf_bytes = editor_json_to_pdf_bytes(project.content_json)
+            export_file, content_hash = open_export(project, 'pdf')
         except Exception as e:
             return Response({'error': f'Failed to generate PDF: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+        safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
+        filename = f"{safe_title or 'document'}.pdf"
+        
         save_to_media = request.data.get('save_to_media', False)
         
         if save_to_media:
-            safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
-            filename = f"{safe_title or 'document'}.pdf"
-            
-            doc_file = DocumentFile.objects.create(
-                project=project,
-                file_type='pdf',
-            )
-            doc_file.file.save(filename, ContentFile(pdf_bytes))
-            doc_file.save()
+            save_export(project, 'pdf', export_file, content_hash, filename)
         
-        response = HttpResponse(pdf_bytes, content_type='application/pdf')
-        safe_title = ''.join(c for c in project.title if c.isalnum() or c in ' -_').strip()
-        filename = f"{safe_title or 'document'}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return FileResponse(export_file, as_attachment=True, filename=filename,
+                            content_type=EXPORT_CONTENT_TYPES['pdf'])
+
+
+class ExportJobDetailView(APIView):
+    def get_object(self, pk, request):
+        owner_id = normalize_owner_id(request)
+        try:
+            return ExportJob.objects.select_related('result').get(pk=pk, project__owner_id=owner_id)
+        except ExportJob.DoesNotExist:
+            return None
+    
+    def get(self, request, pk):
+        job = self.get_object(pk, request)
+        if not job:
+            return Response({'error': 'Export job not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if job.status == ExportJob.STATUS_QUEUED and fail_stale_jobs(ExportJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+        
+        return Response(ExportJobSerializer(job).data)
+
+
+class ExportJobDownloadView(ExportJobDetailView):
+    def get(self, request, pk):
+        job = self.get_object(pk, request)
+        if not job:
+            return Response({'error': 'Export job not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if job.status != ExportJob.STATUS_DONE or job.result is None:
+            return Response({'error': f'Export is {job.status.lower()}.'}, status=status.HTTP_409_CONFLICT)
+        
+        try:
+            f = job.result.file.open('rb')
+        except (OSError, ValueError):
+            return Response({'error': 'Exported file is missing'}, status=status.HTTP_404_NOT_FOUND)
+        
+        safe_title = ''.join(c for c in job.project.title if c.isalnum() or c in ' -_').strip()
+        filename = f"{safe_title or 'document'}.{job.file_type}"
+        return FileResponse(f, as_attachment=True, filename=filename,
+                            content_type=EXPORT_CONTENT_TYPES.get(job.file_type, 'application/octet-stream'))
 
 
 class ImportDocxView(APIView):
@@ -0,0 +1,49 @@
+# project/app/image_store.py
+"""
+Хранилище картинок из разобранных документов с адресацией по содержимому.
+
+Файл лежит в media под своим sha256 и пишется один раз, сколько бы
+документов его ни содержали. В editor_json остаётся только URL, а сам
+ответ отдаётся как неизменяемый (имя файла = хэш содержимого).
+"""
+import hashlib
+import re
+from typing import Tuple
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+IMAGE_DIR = 'parsed_images'
+IMAGE_URL_PREFIX = '/api/parse/images/'
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'tiff': 'image/tiff',
+    'webp': 'image/webp',
+    'emf': 'image/emf',
+    'wmf': 'image/wmf',
+}
+
+IMAGE_NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})\.(?P<ext>[a-z0-9]{1,5})$')
+
+
+def image_path(digest: str, ext: str) -> str:
+    # двухсимвольный префикс, чтобы не складывать всё в один каталог
+    return f'{IMAGE_DIR}/{digest[:2]}/{digest}.{ext}'
+
+
+def store_image(data: bytes, ext: str) -> Tuple[str, str]:
+    """Сохраняет картинку (если такой ещё нет) и возвращает (sha256, URL)."""
+    ext = 'jpeg' if ext == 'jpg' else ext
+    digest = hashlib.sha256(data).hexdigest()
+    path = image_path(digest, ext)
+    if not default_storage.exists(path):
+        saved = default_storage.save(path, ContentFile(data))
+        if saved != path:
+            # параллельная загрузка успела записать тот же файл
+            default_storage.delete(saved)
+    return digest, f'{IMAGE_URL_PREFIX}{digest}.{ext}'
@@ -0,0 +1,137 @@
+# project/app/jobs.py
+"""
+Очередь фонового разбора на таблице ParseJob.
+
+Задание забирается условным UPDATE (status=QUEUED -> RUNNING): из нескольких
+воркеров его получит ровно один, на любой БД и без брокера. Прогресс и
+отмена проверяются после каждой страницы одним UPDATE с условием
+cancel_requested=False. Пока задание идёт, отдельный поток раз в
+PARSE_JOB_HEARTBEAT_INTERVAL обновляет heartbeat_at — долгая страница
+(DOCX целиком, диапазон PDF в пуле) не выглядит упавшим воркером.
+Все записи воркера идут с условием worker=<он сам>: задание, отданное
+другому воркеру, прежний уже не перезапишет.
+"""
+import logging
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import ParseJob
+from .parsing import DocumentParse
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLost(Exception):
+    """Задание вернули в очередь и, возможно, отдали другому воркеру."""
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next_job(worker: str) -> Optional[ParseJob]:
+    for job_id in ParseJob.objects.filter(status=ParseJob.STATUS_QUEUED).values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        claimed = ParseJob.objects.filter(pk=job_id, status=ParseJob.STATUS_QUEUED).update(
+            status=ParseJob.STATUS_RUNNING, worker=worker, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return ParseJob.objects.select_related('document').get(pk=job_id)
+    return None
+
+
+def requeue_stale_jobs() -> int:
+    """Возвращает в очередь задания, чей воркер перестал отмечаться (упал/убит)."""
+    stale_after = getattr(settings, 'PARSE_JOB_STALE_AFTER', 300)
+    deadline = timezone.now() - timedelta(seconds=stale_after)
+    return ParseJob.objects.filter(status=ParseJob.STATUS_RUNNING, heartbeat_at__lt=deadline).update(
+        status=ParseJob.STATUS_QUEUED, worker='', pages_done=0
+    )
+
+
+def request_cancel(job: ParseJob) -> ParseJob:
+    """Ещё не начатое задание отменяется сразу, идущее — после текущей страницы."""
+    now = timezone.now()
+    ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_QUEUED).update(
+        status=ParseJob.STATUS_CANCELLED, cancel_requested=True, finished_at=now
+    )
+    ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_RUNNING).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job: ParseJob) -> str:
+    """Разбирает документ задания; возвращает итоговый статус."""
+    parse = DocumentParse(job.document, job.content_sha256, job.fidelity, job.keep_original_images)
+    try:
+        with _heartbeat(job):
+            # page_count посчитан при загрузке по тем же разрывам, что и разбор
+            _owned(job).update(total_pages=job.document.page_count)
+
+            for page in parse.pages():
+                alive = _owned(job).filter(cancel_requested=False).update(
+                    pages_done=page['page'], heartbeat_at=timezone.now()
+                )
+                if not alive:
+                    if not _owned(job).exists():
+                        # страницы теперь пишет новый владелец — свои недописанные бросаем
+                        parse.abandon()
+                        raise JobLost
+                    raise JobCancelled
+    except JobLost:
+        logger.warning('Parse job %s was requeued while %s was running it', job.pk, job.worker)
+        return ParseJob.objects.get(pk=job.pk).status
+    except JobCancelled:
+        return _finish(job, ParseJob.STATUS_CANCELLED)
+    except Exception as e:
+        logger.exception('Parse job %s failed', job.pk)
+        return _finish(job, ParseJob.STATUS_FAILED, error=f'Failed to parse document: {str(e)}')
+
+    return _finish(job, ParseJob.STATUS_DONE)
+
+
+def _owned(job: ParseJob):
+    return ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_RUNNING, worker=job.worker)
+
+
+@contextmanager
+def _heartbeat(job: ParseJob):
+    interval = getattr(settings, 'PARSE_JOB_HEARTBEAT_INTERVAL', 30)
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                _owned(job).update(heartbeat_at=timezone.now())
+        except Exception:
+            logger.exception('Parse job %s: heartbeat failed', job.pk)
+        finally:
+            connection.close()  # соединение этого потока
+
+    thread = threading.Thread(target=beat, name=f'parse-job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _finish(job: ParseJob, status: str, error: str = '') -> str:
+    finished = _owned(job).update(status=status, error=error, finished_at=timezone.now())
+    if not finished:
+        logger.warning('Parse job %s: %s is no longer its worker, %s not recorded', job.pk, job.worker, status)
+        return ParseJob.objects.get(pk=job.pk).status
+    return status
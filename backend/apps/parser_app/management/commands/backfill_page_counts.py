@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from apps.parser_app.models import ParsedDocument
+from apps.parser_app.utils.parser import count_pages
+
+
+class Command(BaseCommand):
+    help = 'Recount page_count of parsed documents from the original files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only-empty', action='store_true', help='Skip documents that already have page_count')
+
+    def handle(self, *args, **options):
+        documents = ParsedDocument.objects.all().order_by('id')
+        if options['only_empty']:
+            documents = documents.filter(page_count__isnull=True)
+
+        updated = failed = 0
+        for document in documents.iterator():
+            try:
+                if document.file_type.lower() == 'docx' and (document.pages.exists() or document.is_legacy()):
+                    # уже разобранный DOCX отдаёт столько страниц, сколько сохранено
+                    page_count = document.stored_page_count()
+                else:
+                    with document.original_file.open('rb') as f:
+                        page_count = count_pages(f, document.file_type.lower())
+            except Exception as e:
+                self.stderr.write(f'Document {document.pk}: {e}')
+                failed += 1
+                continue
+            if page_count != document.page_count:
+                ParsedDocument.objects.filter(pk=document.pk).update(page_count=page_count)
+                updated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Page count updated for {updated} document(s), {failed} failed.'))
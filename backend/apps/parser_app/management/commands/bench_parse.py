@@ -0,0 +1,70 @@
+import os
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.parser_app.utils.parser import DEFAULT_FIDELITY, FIDELITY_LEVELS, iter_file_pages
+
+
+class Command(BaseCommand):
+    help = 'Benchmark document parsing per fidelity level (text / lines / layout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='PDF or DOCX files to parse')
+        parser.add_argument('--fidelity', action='append', choices=FIDELITY_LEVELS,
+                            help='Level to benchmark (repeatable; default: all)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per file and level; the best one is reported')
+
+    def handle(self, *args, **options):
+        levels = options['fidelity'] or list(FIDELITY_LEVELS)
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(
+            f'{"file":<30} {"fidelity":<8} {"pages":>6} {"elements":>9} {"best, s":>9} {"pages/s":>9} '
+            f'{"speedup":>8} {"peak RSS, MB":>13}'
+        )
+        for path in options['files']:
+            if not os.path.exists(path):
+                raise CommandError(f'File not found: {path}')
+            ext = path.lower().rsplit('.', 1)[-1]
+
+            results = {}
+            for fidelity in levels:
+                results[fidelity] = self._run(path, ext, fidelity, repeat)
+
+            baseline = results.get(DEFAULT_FIDELITY)
+            for fidelity in levels:
+                pages, elements, best, peak_rss = results[fidelity]
+                speedup = f'{baseline[2] / best:.1f}x' if baseline and best else '-'
+                rate = pages / best if best else 0
+                self.stdout.write(
+                    f'{os.path.basename(path)[:30]:<30} {fidelity:<8} {pages:>6} {elements:>9} '
+                    f'{best:>9.3f} {rate:>9.1f} {speedup:>8} {peak_rss:>13.1f}'
+                )
+        self.stdout.write(
+            'Peak RSS is the process high-water mark after the run, so it only grows: '
+            'bench one level per process to compare levels.'
+        )
+
+    @staticmethod
+    def _run(path, ext, fidelity, repeat):
+        best = None
+        pages = elements = 0
+        for _ in range(repeat):
+            pages = elements = 0
+            started = time.perf_counter()
+            with open(path, 'rb') as f:
+                for page in iter_file_pages(f, ext, fidelity):
+                    pages += 1
+                    elements += len(page['elements'])
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return pages, elements, best, _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.parser_app.jobs import claim_next_job, requeue_stale_jobs, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run background parse jobs (POST /api/parse/?async=1). Start several processes for parallelism.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process queued jobs and exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to sleep when the queue is empty (default: PARSE_JOB_POLL_INTERVAL)')
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval'] or getattr(settings, 'PARSE_JOB_POLL_INTERVAL', 1.0)
+        worker = worker_name()
+        self.stdout.write(f'Parse worker {worker} started.')
+
+        try:
+            while True:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s).'))
+
+                job = claim_next_job(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                self.stdout.write(f'Job {job.pk}: parsing {job.document.original_filename}...')
+                status = run_job(job)
+                self.stdout.write(f'Job {job.pk}: {status}')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Parse worker {worker} stopped.'))
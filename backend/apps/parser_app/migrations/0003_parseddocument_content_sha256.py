@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parser_app', '0002_parseddocument_editor_json_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parseddocument',
+            name='content_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='parseddocument',
+            name='parser_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='parseddocument',
+            index=models.Index(fields=['content_sha256', 'parser_version'], name='parser_app__content_baacc7_idx'),
+        ),
+    ]
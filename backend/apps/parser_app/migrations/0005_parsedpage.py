@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parser_app', '0004_parsejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParsedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('elements', models.JSONField(blank=True, default=list)),
+                ('text', models.TextField(blank=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='parser_app.parseddocument')),
+            ],
+            options={
+                'ordering': ['number'],
+                'unique_together': {('document', 'number')},
+            },
+        ),
+    ]
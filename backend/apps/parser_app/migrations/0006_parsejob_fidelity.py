@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parser_app', '0005_parsedpage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsejob',
+            name='fidelity',
+            field=models.CharField(default='lines', max_length=10),
+        ),
+    ]
@@ -14,5 +14,108 @@ class ParsedDocument(models.Model):
     original_file = models.FileField(upload_to='parsed_documents/')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # ключ кэша разбора: одинаковый файл + та же версия парсера = готовый результат
+    content_sha256 = models.CharField(max_length=64, blank=True, default='')
+    parser_version = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_sha256', 'parser_version']),
+        ]
+
     def __str__(self):
         return self.original_filename
+
+    def get_pages(self, first=None, last=None):
+        """
+        Страницы [first, last] как {'page', 'elements', 'text'}.
+        Записи до постраничного хранения отдают editor_json одной страницей.
+        """
+        pages = self.pages.all()
+        if first is not None:
+            pages = pages.filter(number__gte=first)
+        if last is not None:
+            pages = pages.filter(number__lte=last)
+        rows = [
+            {'page': number, 'elements': elements, 'text': text}
+            for number, elements, text in pages.values_list('number', 'elements', 'text')
+        ]
+        if rows or not self.is_legacy():
+            return rows
+        if (first or 1) <= 1 <= (last or 1):
+            return [{'page': 1, 'elements': self.editor_json.get('elements', []), 'text': self.extracted_text}]
+        return []
+
+    def get_elements(self):
+        return [element for page in self.get_pages() for element in page['elements']]
+
+    def stored_page_count(self):
+        if self.is_legacy():
+            return 1
+        return self.pages.count()
+
+    def is_legacy(self):
+        """Документ разобран до появления ParsedPage — всё лежит в editor_json."""
+        return bool(self.editor_json.get('elements')) and not self.pages.exists()
+
+
+class ParsedPage(models.Model):
+    """Результат разбора одной страницы: редактор подгружает только видимые."""
+    document = models.ForeignKey(ParsedDocument, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField()
+    elements = models.JSONField(default=list, blank=True)
+    text = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['number']
+        unique_together = ('document', 'number')
+
+    def __str__(self):
+        return f'{self.document_id} p.{self.number}'
+
+
+class ParseJob(models.Model):
+    """
+    Фоновый разбор (POST /api/parse/?async=1). Очередь — сама таблица:
+    воркер (manage.py parse_worker) забирает задание условным UPDATE,
+    внешний брокер не нужен.
+    """
+    STATUS_QUEUED = 'QUEUED'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CANCELLED = 'CANCELLED'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+    document = models.ForeignKey(ParsedDocument, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    fidelity = models.CharField(max_length=10, default='lines')
+    keep_original_images = models.BooleanField(default=False)
+    content_sha256 = models.CharField(max_length=64, blank=True, default='')
+
+    pages_done = models.IntegerField(default=0)
+    total_pages = models.IntegerField(null=True, blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'ParseJob {self.pk} ({self.status})'
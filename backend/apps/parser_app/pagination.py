@@ -0,0 +1,87 @@
+# project/app/pagination.py
+"""
+Частичная выдача разобранного документа: диапазон страниц (?pages=10-20)
+и курсор по элементам (?cursor=...&limit=N), чтобы редактор подгружал
+только видимую часть большого документа.
+"""
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def parse_page_range(value: str) -> Tuple[int, int]:
+    """'10-20' -> (10, 20), '5' -> (5, 5); страницы нумеруются с 1."""
+    first, sep, last = value.partition('-')
+    try:
+        first = int(first)
+        last = int(last) if sep else first
+    except ValueError:
+        raise InvalidQuery('pages must look like "10-20" or "5".')
+    if first < 1 or last < first:
+        raise InvalidQuery('pages must be a non-empty range starting from 1.')
+    return first, last
+
+
+class ElementCursor:
+    """Позиция в документе: номер страницы и смещение элемента на ней."""
+
+    default_limit = 500
+    max_limit = 5000
+
+    def __init__(self, page: int = 1, offset: int = 0, limit: int = default_limit):
+        self.page = page
+        self.offset = offset
+        self.limit = limit
+
+    @classmethod
+    def from_query(cls, query_params) -> 'ElementCursor':
+        try:
+            limit = int(query_params.get('limit', cls.default_limit))
+        except ValueError:
+            raise InvalidQuery('limit must be an integer.')
+        limit = max(1, min(limit, cls.max_limit))
+
+        token = query_params.get('cursor')
+        if not token:
+            return cls(limit=limit)
+        try:
+            page, offset = base64.urlsafe_b64decode(token.encode()).decode().split(':')
+            return cls(int(page), int(offset), limit)
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            raise InvalidQuery('Invalid cursor.')
+
+    @staticmethod
+    def encode(page: int, offset: int) -> str:
+        return base64.urlsafe_b64encode(f'{page}:{offset}'.encode()).decode()
+
+    def read(self, parsed_doc) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """До limit элементов начиная с курсора и курсор следующей порции (None — конец)."""
+        if parsed_doc.is_legacy():
+            rows = [(page['page'], page['elements']) for page in parsed_doc.get_pages(first=self.page)]
+        else:
+            rows = (
+                parsed_doc.pages.filter(number__gte=self.page)
+                .values_list('number', 'elements')
+                .iterator(chunk_size=20)
+            )
+
+        elements: List[Dict[str, Any]] = []
+        for number, page_elements in rows:
+            start = self.offset if number == self.page else 0
+            taken = page_elements[start:start + self.limit - len(elements)]
+            elements.extend(taken)
+            if len(elements) < self.limit:
+                continue
+
+            end = start + len(taken)
+            if end < len(page_elements):
+                return elements, self.encode(number, end)
+            if parsed_doc.pages.filter(number__gt=number).exists():
+                return elements, self.encode(number + 1, 0)
+            return elements, None
+
+        return elements, None
@@ -0,0 +1,96 @@
+# project/app/parsing.py
+"""
+Постраничный разбор сохранённого ParsedDocument с записью результата в БД.
+Общий для NDJSON-стриминга (?stream=1) и фоновых заданий (parse_worker).
+"""
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.conf import settings
+
+from .models import ParsedDocument, ParsedPage
+from .utils.parser import DEFAULT_FIDELITY, iter_file_pages, parser_version
+
+
+def save_pages(parsed_doc: ParsedDocument, pages: Iterable[Dict[str, Any]]) -> None:
+    ParsedPage.objects.bulk_create([
+        ParsedPage(document=parsed_doc, number=page['page'], elements=page['elements'], text=page['text'])
+        for page in pages
+    ])
+
+
+def copy_pages(source: ParsedDocument, target: ParsedDocument) -> None:
+    batch = []
+    for page in source.pages.iterator(chunk_size=100):
+        batch.append(ParsedPage(document=target, number=page.number, elements=page.elements, text=page.text))
+        if len(batch) >= 100:
+            ParsedPage.objects.bulk_create(batch)
+            batch = []
+    ParsedPage.objects.bulk_create(batch)
+
+
+class DocumentParse:
+    """
+    Разбирает файл документа; pages() отдаёт страницы по мере готовности и
+    каждые PARSE_STREAM_PERSIST_EVERY страниц дописывает новые ParsedPage.
+    Страницы, оставшиеся от прерванного разбора, удаляются перед началом —
+    повторный запуск (задание вернулось в очередь) начинает с чистого листа.
+    Ключ кэша разбора (content_sha256) записывается только после успешного
+    конца, чтобы недоразобранный документ не переиспользовался.
+    """
+
+    def __init__(self, parsed_doc: ParsedDocument, content_sha256: str = '',
+                 fidelity: str = DEFAULT_FIDELITY, keep_original_images: bool = False):
+        self.parsed_doc = parsed_doc
+        self.ext = parsed_doc.file_type.lower()
+        self.content_sha256 = content_sha256
+        self.fidelity = fidelity
+        self.keep_original_images = keep_original_images
+        self.pages_parsed = 0
+        self.plain_pages: List[str] = []
+        self.page_count = parsed_doc.page_count
+        self._unsaved: List[Dict[str, Any]] = []
+        self._abandoned = False
+
+    def pages(self) -> Iterator[Dict[str, Any]]:
+        persist_every = getattr(settings, 'PARSE_STREAM_PERSIST_EVERY', 10)
+        self.parsed_doc.pages.all().delete()
+        try:
+            with self.parsed_doc.original_file.open('rb') as f:
+                for page in iter_file_pages(f, self.ext, self.fidelity, self.keep_original_images,
+                                           self.content_sha256):
+                    self.pages_parsed += 1
+                    if page['text']:
+                        self.plain_pages.append(page['text'])
+                    self._unsaved.append(page)
+                    yield page
+                    if len(self._unsaved) >= persist_every:
+                        self.persist()
+        except BaseException:
+            # ошибка или прерывание (закрытый генератор) — сохраняем то, что успели
+            self.persist(extracted_text='\n'.join(self.plain_pages))
+            raise
+
+        fields = {}
+        if self.page_count != self.pages_parsed:
+            # не удалось узнать заранее (или оценка разошлась) — page_count
+            # всегда равен числу сохранённых страниц
+            self.page_count = fields['page_count'] = self.pages_parsed
+        self.persist(
+            extracted_text='\n'.join(self.plain_pages),
+            content_sha256=self.content_sha256,
+            parser_version=parser_version(self.fidelity, self.keep_original_images),
+            **fields,
+        )
+
+    def abandon(self) -> None:
+        """Разбор прекращён без записи: документ уже разбирает другой воркер."""
+        self._abandoned = True
+        self._unsaved = []
+
+    def persist(self, **fields) -> None:
+        if self._abandoned:
+            return
+        save_pages(self.parsed_doc, self._unsaved)
+        self._unsaved = []
+        if fields:
+            ParsedDocument.objects.filter(pk=self.parsed_doc.pk).update(**fields)
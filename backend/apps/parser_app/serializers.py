@@ -1,6 +1,6 @@
 # project/app/serializers.py
 from rest_framework import serializers
-from .models import ParsedDocument
+from .models import ParsedDocument, ParseJob
 
 
 class ParsedDocumentSerializer(serializers.ModelSerializer):
@@ -19,10 +19,29 @@ class ParsedDocumentSerializer(serializers.ModelSerializer):
         # если frontend запросил ?format=editor вернём структуру
         request = self.context.get('request')
         if request and request.query_params.get('format') == 'editor':
-            return obj.editor_json.get('elements', [])
+            return obj.get_elements()
         return None  # иначе не засоряем ответ
 
 
+class ParseJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ParseJob
+        fields = [
+            'id', 'document', 'status', 'pages_done', 'total_pages', 'progress',
+            'cancel_requested', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj: ParseJob):
+        if obj.status == ParseJob.STATUS_DONE:
+            return 1.0
+        if not obj.total_pages:
+            return None
+        return round(min(obj.pages_done / obj.total_pages, 1.0), 4)
+
+
 class ParseUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
 
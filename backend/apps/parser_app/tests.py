@@ -0,0 +1,304 @@
+import io
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Inches, Pt, RGBColor
+from PIL import Image as PILImage
+from PyPDF2 import PdfWriter
+from PyPDF2.errors import DependencyError
+from reportlab.pdfgen import canvas
+
+from .jobs import claim_next_job, requeue_stale_jobs, run_job
+from .models import ParsedDocument, ParseJob
+from .parsing import save_pages
+from .utils.docx_parser import _read_docx_python_docx, parse_docx
+from .utils.docx_xml import read_docx
+from .utils.images import prepare_image
+from .utils.parser import count_pages, iter_file_pages
+
+
+def encrypt_pdf(data, user_password=''):
+    writer = PdfWriter()
+    writer.append(io.BytesIO(data))
+    writer.encrypt(user_password, 'owner')
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def make_pdf(pages, lines=1):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for number in range(1, pages + 1):
+        pdf.drawString(72, 720, f'Page {number}')
+        for line in range(1, lines):
+            pdf.drawString(72, 720 - line * 18, f'Page {number} line {line} lorem ipsum dolor sit amet')
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+# разбор в отдельном процессе: ru_maxrss — пик только этого разбора
+PEAK_RSS_SCRIPT = """
+import os, resource, sys
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+from apps.parser_app.utils.parser import iter_file_pages
+with open(sys.argv[1], 'rb') as f:
+    pages = sum(1 for _ in iter_file_pages(f, 'pdf', 'lines'))
+print(pages, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def make_palette_png(width=1000, height=600):
+    # шум: палитровый PNG, который не сжимается лучше уменьшенной копии
+    image = PILImage.frombytes('RGB', (width, height), random.Random(0).randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.convert('P', palette=PILImage.ADAPTIVE).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_docx(*images):
+    document = Document()
+    for image in images:
+        document.add_picture(io.BytesIO(image), width=Inches(4))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class ImagePreparationTests(MediaRootMixin, TestCase):
+    def test_large_palette_png_is_downscaled(self):
+        blob = make_palette_png()
+        self.assertEqual(PILImage.open(io.BytesIO(blob)).mode, 'P')
+
+        image = prepare_image(blob)
+        self.assertEqual((image['width'], image['height']), (250, 150))
+        self.assertLess(len(image['data']), len(blob))
+        self.assertEqual(PILImage.open(io.BytesIO(image['data'])).size, (500, 300))
+
+    def test_palette_png_in_docx_is_kept(self):
+        elements = parse_docx(make_docx(make_palette_png()))['elements']
+        images = [element for element in elements if element['type'] == 'image']
+        self.assertEqual(len(images), 1)
+        self.assertEqual(images[0]['width'], 250)
+
+
+class ParseJobTestMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root, PARSE_STREAM_PERSIST_EVERY=2)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        data = make_pdf(5)
+        self.document = ParsedDocument.objects.create(
+            original_filename='five.pdf', file_type='PDF', file_size=len(data), page_count=5,
+            original_file=ContentFile(data, name='five.pdf'),
+        )
+        self.job = ParseJob.objects.create(document=self.document)
+
+    def page_numbers(self):
+        return list(self.document.pages.values_list('number', flat=True))
+
+
+class ParseJobRequeueTests(ParseJobTestMixin, TestCase):
+    def test_requeue_after_partial_persist(self):
+        self.assertIsNotNone(claim_next_job('crashed-worker'))
+
+        # воркер успел записать две страницы и умер
+        save_pages(self.document, [
+            {'page': number, 'elements': [], 'text': f'stale {number}'} for number in (1, 2)
+        ])
+        ParseJob.objects.filter(pk=self.job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+
+        job = claim_next_job('second-worker')
+        self.assertEqual(run_job(job), ParseJob.STATUS_DONE)
+
+        job.refresh_from_db()
+        self.assertEqual(job.error, '')
+        self.assertEqual(self.page_numbers(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.document.pages.get(number=1).text, 'Page 1')
+
+    def test_requeued_worker_does_not_overwrite_new_owner(self):
+        stale = claim_next_job('first-worker')
+        ParseJob.objects.filter(pk=self.job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        requeue_stale_jobs()
+        self.assertIsNotNone(claim_next_job('second-worker'))
+
+        self.assertEqual(run_job(stale), ParseJob.STATUS_RUNNING)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ParseJob.STATUS_RUNNING)
+        self.assertEqual(self.job.worker, 'second-worker')
+        self.assertEqual(self.page_numbers(), [])
+
+
+class ParseJobHeartbeatTests(ParseJobTestMixin, TransactionTestCase):
+    @override_settings(PARSE_JOB_HEARTBEAT_INTERVAL=0.05, PARSE_JOB_STALE_AFTER=0.2)
+    def test_slow_page_keeps_job_claimed(self):
+        job = claim_next_job('worker')
+
+        def slow_pages(*args, **kwargs):
+            # одна «страница» дольше PARSE_JOB_STALE_AFTER, как DOCX целиком
+            time.sleep(0.5)
+            self.assertEqual(requeue_stale_jobs(), 0)
+            yield {'page': 1, 'elements': [], 'text': 'slow'}
+
+        with mock.patch('apps.parser_app.parsing.iter_file_pages', slow_pages):
+            self.assertEqual(run_job(job), ParseJob.STATUS_DONE)
+        self.assertEqual(self.page_numbers(), [1])
+
+
+class DocxPagesTests(MediaRootMixin, TestCase):
+    def make_paged_docx(self):
+        document = Document()
+        document.add_paragraph('first page')
+        document.add_paragraph('still first').add_run().add_break(WD_BREAK.PAGE)
+        document.add_paragraph('second page')
+        document.add_paragraph('third page').paragraph_format.page_break_before = True
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return buffer.getvalue()
+
+    def test_page_count_matches_stored_pages(self):
+        data = self.make_paged_docx()
+        page_count = count_pages(io.BytesIO(data), 'docx')
+        self.assertEqual(page_count, 3)
+
+        document = ParsedDocument.objects.create(
+            original_filename='paged.docx', file_type='DOCX', file_size=len(data), page_count=page_count,
+            original_file=ContentFile(data, name='paged.docx'),
+        )
+        job = ParseJob.objects.create(document=document)
+        self.assertEqual(run_job(claim_next_job('worker')), ParseJob.STATUS_DONE)
+
+        job.refresh_from_db()
+        document.refresh_from_db()
+        self.assertEqual((job.total_pages, job.pages_done, document.page_count), (3, 3, 3))
+
+        response = self.client.get(f'/api/parse/{document.pk}/?pages=2-3').json()
+        self.assertEqual(response['total_pages'], 3)
+        self.assertEqual([page['text'] for page in response['pages']], ['second page', 'third page'])
+
+
+def make_rich_docx():
+    """Заголовки, runs с оформлением, гиперссылка, табуляция, объединённые ячейки, разрыв страницы, картинки."""
+    document = Document()
+    document.add_heading('Report', level=1)
+    paragraph = document.add_paragraph()
+    run = paragraph.add_run('Bold red')
+    run.bold, run.font.size, run.font.name, run.font.color.rgb = True, Pt(18), 'Arial', RGBColor(0xCC, 0, 0)
+    paragraph.add_run(' plain\ttab').italic = True
+    paragraph.add_run().add_break()
+    paragraph.add_run('after break')
+    paragraph._p.append(parse_xml(
+        f'<w:hyperlink {nsdecls("w", "r")} r:id="rId99"><w:r><w:t xml:space="preserve"> link</w:t></w:r></w:hyperlink>'
+    ))
+    document.add_heading('Section', level=2).runs[0].italic = True
+    document.add_paragraph('')
+
+    table = document.add_table(rows=3, cols=3)
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f'r{r}c{c}'
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(2, 2))
+
+    document.add_paragraph('next page').paragraph_format.page_break_before = True
+    document.add_picture(io.BytesIO(make_palette_png(40, 30)))
+    document.add_paragraph('').add_run().add_picture(io.BytesIO(make_palette_png(30, 20)))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class DocxReadersTests(MediaRootMixin, TestCase):
+    """Потоковый lxml-ридер и запасной python-docx дают один и тот же результат."""
+
+    def test_blocks_and_images_match(self):
+        data = make_rich_docx()
+        for with_format in (True, False):
+            with self.subTest(with_format=with_format):
+                blocks, images = read_docx(io.BytesIO(data), with_format)
+                self.assertEqual((blocks, images), _read_docx_python_docx(io.BytesIO(data), with_format, True))
+
+        self.assertEqual(blocks[1]['text'], 'Bold red plain\ttab\nafter break link')
+        self.assertEqual(read_docx(io.BytesIO(data))[0][1]['format'], (True, None, 18, 'Arial', '#CC0000'))
+        self.assertEqual(blocks[4]['data'][0][:2], ['r0c0\nr0c1', 'r0c0\nr0c1'])
+        self.assertEqual(len(images), 2)
+
+    def test_parse_docx_matches(self):
+        data = make_rich_docx()
+        with override_settings(PARSE_DOCX_LXML=True):
+            lxml_result = parse_docx(io.BytesIO(data), doc_key='same')
+        with override_settings(PARSE_DOCX_LXML=False):
+            python_docx_result = parse_docx(io.BytesIO(data), doc_key='same')
+        self.assertEqual(lxml_result, python_docx_result)
+        self.assertEqual(len([e for e in lxml_result['elements'] if e['type'] == 'image']), 2)
+
+
+class PdfTextFidelityTests(SimpleTestCase):
+    def text_pages(self, data):
+        return [page['text'] for page in iter_file_pages(io.BytesIO(data), 'pdf', 'text', doc_key='key')]
+
+    def test_encrypted_with_empty_password(self):
+        self.assertEqual(self.text_pages(encrypt_pdf(make_pdf(3))), ['Page 1', 'Page 2', 'Page 3'])
+
+    def test_falls_back_to_pdfplumber_when_pypdf2_cannot_decrypt(self):
+        data = encrypt_pdf(make_pdf(3))
+        # PyPDF2 без провайдера шифра (AES) падает на чтении потоков
+        with mock.patch('PyPDF2._page.PageObject.extract_text', side_effect=DependencyError('no AES provider')):
+            self.assertEqual(self.text_pages(data), ['Page 1', 'Page 2', 'Page 3'])
+
+
+class PdfPeakMemoryTests(SimpleTestCase):
+    # без постраничного освобождения 1000 страниц этого файла занимали ~600 МБ против ~75 МБ на 10
+    MAX_GROWTH_MB = 50
+
+    def peak_rss_mb(self, pages):
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+            f.write(make_pdf(pages, lines=5))
+            f.flush()
+            # пул процессов выключен: память его воркеров в ru_maxrss не попадает
+            env = {**os.environ, 'PDF_PARALLEL_WORKERS': '1'}
+            result = subprocess.run(
+                [sys.executable, '-c', PEAK_RSS_SCRIPT, f.name], cwd=settings.BASE_DIR, env=env,
+                capture_output=True, text=True, check=True,
+            )
+        parsed, peak = map(int, result.stdout.split())
+        self.assertEqual(parsed, pages)
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    def test_peak_rss_does_not_grow_with_page_count(self):
+        small, large = self.peak_rss_mb(10), self.peak_rss_mb(1000)
+        self.assertLess(large - small, self.MAX_GROWTH_MB, f'10 pages: {small:.0f} MB, 1000 pages: {large:.0f} MB')
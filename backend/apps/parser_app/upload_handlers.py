@@ -0,0 +1,29 @@
+# project/app/upload_handlers.py
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class Sha256UploadHandler(FileUploadHandler):
+    """
+    Считает sha256 каждого файла по мере поступления чанков и передаёт их
+    дальше по цепочке без изменений — сам файл сохраняют следующие обработчики.
+    Ставится первым: request.upload_handlers.insert(0, handler).
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.digests = {}
+        self._hash = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hash.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = self._hash.hexdigest()
+        return None
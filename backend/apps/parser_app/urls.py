@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import parse_document, get_parsed_document
+from .views import parse_document, get_parsed_document, get_parsed_image, get_parse_job, cancel_parse_job
 
 urlpatterns = [
     path('parse/', parse_document, name='parse-document'),
     path('parse/<int:pk>/', get_parsed_document, name='get-parsed-document'),
+    path('parse/jobs/<int:pk>/', get_parse_job, name='get-parse-job'),
+    path('parse/jobs/<int:pk>/cancel/', cancel_parse_job, name='cancel-parse-job'),
+    path('parse/images/<str:name>', get_parsed_image, name='get-parsed-image'),
 ]
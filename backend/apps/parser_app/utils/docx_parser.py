@@ -1,86 +1,191 @@
 # project/app/utils/docx_parser.py
 from __future__ import annotations
 
-import base64
-import io
-from typing import List, Dict, Any
+import logging
+from typing import List, Dict, Any, Iterator, Tuple
 
+from django.conf import settings
 from docx import Document
 from docx.text.paragraph import Paragraph
 from docx.table import Table
-from PIL import Image as PILImage
 
+from .docx_xml import page_breaks, read_docx
 from .elements import make_text_element, make_table_element, make_image_element
+from .images import prepare_images
+from ..image_store import store_image
 
+logger = logging.getLogger(__name__)
 
-def parse_docx(file_obj) -> Dict[str, Any]:
+
+def parse_docx(file_obj, keep_original_images: bool = False, doc_key: str = "") -> Dict[str, Any]:
     """
     Разбирает DOCX-файл в структуру элементов редактора.
     Возвращает {'elements': List[Element], 'text': str}
+    keep_original_images — сохранить и исходные картинки (properties.originalSrc).
+    doc_key — sha256 файла для id элементов (см. elements.py).
     """
-    doc = Document(file_obj)
     elements: List[Dict[str, Any]] = []
-    y_offset = 40
-    page_w = 794  # A4 px
-    plain_chunks = []
+    plain_pages = []
+    for page in iter_docx_pages(file_obj, keep_original_images, doc_key):
+        elements.extend(page["elements"])
+        if page["text"]:
+            plain_pages.append(page["text"])
+    return {"elements": elements, "text": "\n".join(plain_pages)}
 
-    for block in _iter_block_items(doc):
-        if isinstance(block, Paragraph):
-            if not block.text.strip():
-                y_offset += 12
-                continue
-            bold, italic, size, font, color = _extract_parfmt(block)
-            h = max(20, int(size * 1.4))
-            elements.append(
-                make_text_element(
-                    x=40,
-                    y=y_offset,
-                    width=page_w - 80,
-                    height=h,
-                    content=block.text,
-                    font=font,
-                    size=size,
-                    bold=bold,
-                    italic=italic,
-                    color=color,
+
+def iter_docx_pages(file_obj, keep_original_images: bool = False, doc_key: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Постраничный разбор: {'page', 'elements', 'text'} на каждую страницу.
+    Страницы делятся по разрывам в разметке (docx_xml.page_breaks) — их
+    столько же, сколько насчитал count_docx_pages; y элементов отсчитывается
+    от начала своей страницы. Картинки — на последней странице.
+    """
+    blocks, blobs = _read_docx(file_obj)
+    pages = _paginate(blocks)
+    page_w = 794  # A4 px
+    for number, page_blocks in enumerate(pages, start=1):
+        elements: List[Dict[str, Any]] = []
+        y_offset = 40
+        plain_chunks = []
+
+        for index, block in page_blocks:
+            if block["type"] == "paragraph":
+                if not block["text"].strip():
+                    y_offset += 12
+                    continue
+                bold, italic, size, font, color = block["format"]
+                h = max(20, int(size * 1.4))
+                elements.append(
+                    make_text_element(
+                        x=40,
+                        y=y_offset,
+                        width=page_w - 80,
+                        height=h,
+                        content=block["text"],
+                        font=font,
+                        size=size,
+                        bold=bold,
+                        italic=italic,
+                        color=color,
+                        doc_key=doc_key,
+                        position=str(index),
+                    )
+                )
+                plain_chunks.append(block["text"])
+                y_offset += h + 6
+
+            else:
+                h = len(block["data"]) * 28
+                elements.append(
+                    make_table_element(
+                        x=40, y=y_offset, width=page_w - 80, height=h, data=block["data"], cols=block["cols"],
+                        doc_key=doc_key, position=str(index),
+                    )
                 )
-            )
-            plain_chunks.append(block.text)
-            y_offset += h + 6
+                plain_chunks.append(_table_to_plaintext(block["data"]))
+                y_offset += h + 12
 
-        elif isinstance(block, Table):
-            h = len(block.rows) * 28
-            elements.append(
-                make_table_element(x=40, y=y_offset, width=page_w - 80, height=h, table=block)
-            )
-            plain_chunks.append(_table_to_plaintext(block))
-            y_offset += h + 12
-
-    # картинки
-    for rel in doc.part.rels.values():
-        if "image" not in rel.target_ref:
+        if number == len(pages):
+            elements.extend(_image_elements(blobs, y_offset, keep_original_images, doc_key))
+        yield {"page": number, "elements": elements, "text": "\n".join(plain_chunks)}
+
+
+def _image_elements(blobs: List[bytes], y_offset: int, keep_original_images: bool, doc_key: str):
+    # картинки: уменьшаются до размера отображения, оригинал — только по запросу
+    elements = []
+    for image_index, (blob, image) in enumerate(zip(blobs, prepare_images(blobs))):
+        if image is None:
             continue
+        digest, src = store_image(image["data"], image["ext"])
+        element = make_image_element(
+            x=40,
+            y=y_offset,
+            width=image["width"],
+            height=image["height"],
+            src=src,
+            digest=digest,
+            doc_key=doc_key,
+            position=f"img:{image_index}",
+        )
+        if keep_original_images and image["data"] is not blob:
+            element["properties"]["originalSrc"] = store_image(blob, image["source_ext"])[1]
+        elements.append(element)
+        y_offset += image["height"] + 12
+    return elements
+
+
+def extract_docx_text(file_obj) -> str:
+    """Только текст (fidelity='text'): без элементов, стилей и картинок."""
+    return "\n".join(page["text"] for page in iter_docx_text_pages(file_obj) if page["text"])
+
+
+def iter_docx_text_pages(file_obj) -> Iterator[Dict[str, Any]]:
+    """Постраничный extract_docx_text: те же страницы, что у iter_docx_pages, без элементов."""
+    blocks, _ = _read_docx(file_obj, with_format=False, with_images=False)
+    for number, page_blocks in enumerate(_paginate(blocks), start=1):
+        plain_chunks = []
+        for index, block in page_blocks:
+            if block["type"] == "paragraph":
+                if block["text"].strip():
+                    plain_chunks.append(block["text"])
+            else:
+                plain_chunks.append(_table_to_plaintext(block["data"]))
+        yield {"page": number, "elements": [], "text": "\n".join(plain_chunks)}
+
+
+def _paginate(blocks: List[Dict[str, Any]]) -> List[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Блоки (с номером в документе) по страницам. Как и count_docx_pages:
+    отрисованные Word разрывы, если они есть в документе, иначе явные.
+    Несколько разрывов подряд дают пустые страницы — они тоже сохраняются.
+    """
+    rendered = any(block["breaks"][0] or block["breaks"][1] for block in blocks)
+    pages: List[List[Tuple[int, Dict[str, Any]]]] = [[]]
+    for index, block in enumerate(blocks):
+        before, after = block["breaks"][:2] if rendered else block["breaks"][2:]
+        pages.extend([] for _ in range(before))
+        pages[-1].append((index, block))
+        pages.extend([] for _ in range(after))
+    return pages
+
+
+# ---------- чтение документа ----------
+def _read_docx(file_obj, with_format: bool = True, with_images: bool = True) -> Tuple[List[Dict[str, Any]], List[bytes]]:
+    """
+    Блоки тела и картинки документа (формат — см. docx_xml.read_docx).
+    Основной путь — потоковый lxml; если он не справился с документом,
+    тот же результат строится через python-docx.
+    """
+    if getattr(settings, "PARSE_DOCX_LXML", True):
         try:
-            img_bytes = rel.target_part.blob
-            img = PILImage.open(io.BytesIO(img_bytes))
-            ext = img.format.lower()
-            w, h = img.size
-            scale = min(250, w) / w
-            elements.append(
-                make_image_element(
-                    x=40,
-                    y=y_offset,
-                    width=int(w * scale),
-                    height=int(h * scale),
-                    image_bytes=img_bytes,
-                    ext=ext,
-                )
-            )
-            y_offset += int(h * scale) + 12
+            return read_docx(file_obj, with_format, with_images)
         except Exception:
-            continue
+            logger.warning("lxml DOCX reader failed, falling back to python-docx", exc_info=True)
+            if hasattr(file_obj, "seek"):
+                file_obj.seek(0)
+    return _read_docx_python_docx(file_obj, with_format, with_images)
+
+
+def _read_docx_python_docx(file_obj, with_format: bool, with_images: bool):
+    doc = Document(file_obj)
+    blocks: List[Dict[str, Any]] = []
+    for block in _iter_block_items(doc):
+        if isinstance(block, Paragraph):
+            text = block.text
+            fmt = _extract_parfmt(block) if with_format and text.strip() else None
+            blocks.append({"type": "paragraph", "text": text, "format": fmt, "breaks": page_breaks(block._p)})
+        elif isinstance(block, Table):
+            data = [[cell.text.strip() for cell in row.cells] for row in block.rows]
+            blocks.append({"type": "table", "data": data, "cols": len(block.columns), "breaks": page_breaks(block._tbl)})
 
-    return {"elements": elements, "text": "\n".join(plain_chunks)}
+    blobs = []
+    if with_images:
+        blobs = [
+            rel.target_part.blob
+            for rel in doc.part.rels.values()
+            if not rel.is_external and "image" in rel.target_ref
+        ]
+    return blocks, blobs
 
 
 # ---------- вспомогательные функции ----------
@@ -112,8 +217,6 @@ def _extract_parfmt(par: Paragraph):
     return bold, italic, size, font, color
 
 
-def _table_to_plaintext(table: Table) -> str:
+def _table_to_plaintext(data: List[List[str]]) -> str:
     """Для plain-text представления таблицы."""
-    return "\n".join(
-        "\t".join(cell.text.strip() for cell in row.cells) for row in table.rows
-    )
\ No newline at end of file
+    return "\n".join("\t".join(row) for row in data)
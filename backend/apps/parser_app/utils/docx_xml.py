@@ -0,0 +1,307 @@
+# project/app/utils/docx_xml.py
+"""
+Быстрое чтение DOCX напрямую через lxml, без объектов python-docx.
+
+word/document.xml читается потоково (iterparse): каждый блок тела —
+абзац или таблица — разбирается сразу по закрытии тега и удаляется из
+дерева. Семантика повторяет python-docx 1.x: Paragraph.text (runs и
+hyperlinks, w:tab/w:br/w:cr/w:noBreakHyphen/w:ptab), свойства первого
+run и row.cells (gridSpan повторяет ячейку, vMerge="continue" берёт
+ячейку сверху по той же позиции сетки). Значения атрибутов
+конвертируются теми же simpletypes, поэтому на кривом XML падает там же,
+где python-docx — вызывающий код тогда переходит на python-docx.
+"""
+from __future__ import annotations
+
+import posixpath
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from docx.oxml.simpletypes import ST_HexColor, ST_HexColorAuto, ST_HpsMeasure, ST_OnOff
+from lxml import etree
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+_BODY, _P, _TBL, _TR, _TC = W + "body", W + "p", W + "tbl", W + "tr", W + "tc"
+_R, _HYPERLINK, _RPR = W + "r", W + "hyperlink", W + "rPr"
+_T, _TAB, _PTAB, _BR, _CR, _NO_BREAK_HYPHEN = W + "t", W + "tab", W + "ptab", W + "br", W + "cr", W + "noBreakHyphen"
+_VAL = W + "val"
+_PPR, _SECT_PR, _TYPE, _PAGE_BREAK_BEFORE = W + "pPr", W + "sectPr", W + "type", W + "pageBreakBefore"
+_LAST_RENDERED_PAGE_BREAK = W + "lastRenderedPageBreak"
+
+Block = Dict[str, Any]
+
+
+def read_docx(file_obj, with_format: bool = True, with_images: bool = True) -> Tuple[List[Block], List[bytes]]:
+    """
+    Блоки тела документа по порядку и картинки из связей документа.
+    Блок: {'type': 'paragraph', 'text', 'format', 'breaks'} или {'type': 'table', 'data', 'cols', 'breaks'};
+    format — (bold, italic, size, font, color) как у _extract_parfmt, только для непустых абзацев,
+    breaks — разрывы страниц в блоке (см. page_breaks).
+    """
+    with zipfile.ZipFile(file_obj) as package:
+        part_name = _main_part_name(package)
+        with package.open(part_name) as xml:
+            blocks = _read_body(xml, with_format)
+        images = _read_images(package, part_name) if with_images else []
+    return blocks, images
+
+
+def count_docx_pages(file_obj) -> int:
+    """
+    Число страниц без разбора содержимого — по тем же разрывам в разметке
+    document.xml, по которым разбор делит DOCX на страницы (page_breaks):
+    page_count всегда совпадает с числом сохранённых страниц.
+    """
+    with zipfile.ZipFile(file_obj) as package:
+        with package.open(_main_part_name(package)) as xml:
+            pages = _estimate_pages(xml)
+    if hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    return pages
+
+
+def page_breaks(block) -> Tuple[int, int, int, int]:
+    """
+    Разрывы страниц внутри блока тела (w:p или w:tbl; подходит и элемент
+    python-docx): (отрисованные до, отрисованные после, явные до, явные после).
+    Отрисованные — w:lastRenderedPageBreak, границы страниц при последней
+    вёрстке в Word; явные — w:br type="page", pageBreakBefore и разрыв
+    раздела не continuous. «До» — разрыв раньше первого текста блока:
+    блок начинается с новой страницы; разрыв раздела всегда после абзаца.
+    """
+    rendered, explicit = [0, 0], [0, 0]
+    text_seen = False
+    for elem in block.iter():
+        tag = elem.tag
+        if tag == _T:
+            text_seen = text_seen or bool(elem.text)
+        elif tag == _LAST_RENDERED_PAGE_BREAK:
+            rendered[text_seen] += 1
+        elif tag == _BR:
+            if elem.get(_TYPE) == "page":
+                explicit[text_seen] += 1
+        elif tag == _PAGE_BREAK_BEFORE:
+            if elem.get(_VAL) not in ("0", "false", "off"):
+                explicit[text_seen] += 1
+        elif tag == _SECT_PR and elem.getparent().tag == _PPR:
+            # раздел внутри абзаца; последний (у w:body) разрыва не даёт
+            sect_type = elem.find(_TYPE)
+            kind = sect_type.get(_VAL) if sect_type is not None else "nextPage"
+            explicit[1] += kind not in ("continuous", "nextColumn")
+    return rendered[0], rendered[1], explicit[0], explicit[1]
+
+
+def _main_part_name(package: zipfile.ZipFile) -> str:
+    part_name = _package_part_name(package, _OFFICE_DOCUMENT)
+    if part_name is None:
+        raise ValueError("No main document part")
+    return part_name
+
+
+def _package_part_name(package: zipfile.ZipFile, rel_type: str) -> Optional[str]:
+    rels = etree.fromstring(package.read("_rels/.rels"))
+    for rel in rels.iter(_RELS):
+        if rel.get("Type") == rel_type:
+            return _resolve("/", rel.get("Target"))
+    return None
+
+
+def _resolve(base_dir: str, target: str) -> str:
+    """Имя части в zip (без ведущего '/') по Target связи."""
+    return posixpath.normpath(posixpath.join(base_dir, target)).lstrip("/")
+
+
+def _estimate_pages(xml) -> int:
+    """
+    Если Word сохранил w:lastRenderedPageBreak — 1 + их число, иначе
+    1 + явные разрывы. Считаются только абзацы и таблицы тела — те же
+    блоки, что попадают в разбор.
+    """
+    rendered = explicit = 0
+    for elem in _iter_body_blocks(xml):
+        if elem.tag in (_P, _TBL):
+            breaks = page_breaks(elem)
+            rendered += breaks[0] + breaks[1]
+            explicit += breaks[2] + breaks[3]
+    return 1 + (rendered or explicit)
+
+
+def _read_images(package: zipfile.ZipFile, part_name: str) -> List[bytes]:
+    # doc.part.rels.values() с фильтром "image" in rel.target_ref
+    base_dir = "/" + posixpath.dirname(part_name)
+    rels_name = posixpath.join(posixpath.dirname(part_name), "_rels", posixpath.basename(part_name) + ".rels")
+    if rels_name not in package.namelist():
+        return []
+
+    blobs = []
+    for rel in etree.fromstring(package.read(rels_name)).iter(_RELS):
+        if rel.get("TargetMode") == "External":
+            continue  # внешняя ссылка — байтов в пакете нет
+        target_name = _resolve(base_dir, rel.get("Target"))
+        # target_ref у python-docx — путь части относительно каталога документа
+        if "image" not in posixpath.relpath("/" + target_name, base_dir):
+            continue
+        blobs.append(package.read(target_name))
+    return blobs
+
+
+def _iter_body_blocks(xml):
+    """
+    Дочерние элементы w:body по закрытии тега; после обработки блок
+    удаляется из дерева, чтобы оно не росло.
+    """
+    body = None
+    for event, elem in etree.iterparse(xml, events=("start", "end"), remove_blank_text=True, resolve_entities=False):
+        if event == "start":
+            if elem.tag == _BODY and body is None:
+                body = elem
+            continue
+        if body is None or elem.getparent() is not body:
+            continue
+
+        yield elem
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del body[0]
+
+
+def _read_body(xml, with_format: bool) -> List[Block]:
+    blocks: List[Block] = []
+    for elem in _iter_body_blocks(xml):
+        tag = elem.tag
+        if tag.endswith("p"):
+            if tag != _P:
+                raise ValueError(f"Unexpected body element {tag}")
+            text = _paragraph_text(elem)
+            block = {"type": "paragraph", "text": text, "format": None}
+            if with_format and text.strip():
+                block["format"] = _paragraph_format(elem)
+            block["breaks"] = page_breaks(elem)
+            blocks.append(block)
+        elif tag.endswith("tbl"):
+            if tag != _TBL:
+                raise ValueError(f"Unexpected body element {tag}")
+            block = _table(elem)
+            block["breaks"] = page_breaks(elem)
+            blocks.append(block)
+    return blocks
+
+
+def _run_text(r) -> str:
+    parts = []
+    for e in r:
+        tag = e.tag
+        if tag == _T:
+            parts.append(e.text or "")
+        elif tag == _TAB or tag == _PTAB:
+            parts.append("\t")
+        elif tag == _BR:
+            parts.append("\n" if e.get(W + "type", "textWrapping") == "textWrapping" else "")
+        elif tag == _CR:
+            parts.append("\n")
+        elif tag == _NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_text(p) -> str:
+    parts = []
+    for child in p:
+        if child.tag == _R:
+            parts.append(_run_text(child))
+        elif child.tag == _HYPERLINK:
+            parts.extend(_run_text(r) for r in child if r.tag == _R)
+    return "".join(parts)
+
+
+def _on_off(rPr, name: str) -> Optional[bool]:
+    element = rPr.find(W + name)
+    if element is None:
+        return None
+    val = element.get(_VAL)
+    return True if val is None else ST_OnOff.convert_from_xml(val)
+
+
+def _required_val(element) -> str:
+    val = element.get(_VAL)
+    if val is None:
+        raise ValueError(f"required w:val attribute not present on {element.tag}")
+    return val
+
+
+def _paragraph_format(p):
+    """То же, что _extract_parfmt(Paragraph): свойства первого run абзаца."""
+    bold = italic = False
+    size, font, color = 14, "Inter", "#1a1a1a"
+    r = p.find(_R)
+    if r is None:
+        return bold, italic, size, font, color
+
+    rPr = r.find(_RPR)
+    if rPr is None:
+        return None, None, size, font, color
+
+    bold, italic = _on_off(rPr, "b"), _on_off(rPr, "i")
+    sz = rPr.find(W + "sz")
+    if sz is not None:
+        length = ST_HpsMeasure.convert_from_xml(_required_val(sz))
+        if length:
+            size = int(length.pt)
+    rFonts = rPr.find(W + "rFonts")
+    if rFonts is not None and rFonts.get(W + "ascii"):
+        font = rFonts.get(W + "ascii")
+    element = rPr.find(W + "color")
+    if element is not None:
+        rgb = ST_HexColor.convert_from_xml(_required_val(element))
+        if rgb != ST_HexColorAuto.AUTO:
+            color = f"#{rgb}"
+    return bold, italic, size, font, color
+
+
+def _cell_props(tc) -> Tuple[int, Optional[str]]:
+    """(gridSpan, vMerge) ячейки."""
+    tcPr = tc.find(W + "tcPr")
+    if tcPr is None:
+        return 1, None
+    span = tcPr.find(W + "gridSpan")
+    v_merge = tcPr.find(W + "vMerge")
+    return (
+        1 if span is None else int(_required_val(span)),
+        None if v_merge is None else v_merge.get(_VAL, "continue"),
+    )
+
+
+def _table(tbl) -> Block:
+    grid = tbl.find(W + "tblGrid")
+    if grid is None:
+        raise ValueError("w:tbl has no w:tblGrid")
+
+    data: List[List[str]] = []
+    above: Dict[int, List[str]] = {}  # позиция сетки -> ячейки, которые дал tc предыдущей строки
+    for tr in tbl.iterchildren(_TR):
+        trPr = tr.find(W + "trPr")
+        grid_before = trPr.find(W + "gridBefore") if trPr is not None else None
+        offset = 0 if grid_before is None else int(_required_val(grid_before))
+
+        row: List[str] = []
+        current: Dict[int, List[str]] = {}
+        for tc in tr.iterchildren(_TC):
+            span, v_merge = _cell_props(tc)
+            if v_merge == "continue":
+                if offset not in above:
+                    raise ValueError(f"no `tc` element at grid_offset={offset}")
+                cells = above[offset]
+            else:
+                text = "\n".join(_paragraph_text(p) for p in tc.iterchildren(_P)).strip()
+                cells = [text] * span
+            current[offset] = cells
+            row.extend(cells)
+            offset += span
+        data.append(row)
+        above = current
+
+    return {"type": "table", "data": data, "cols": len(grid.findall(W + "gridCol"))}
@@ -1,17 +1,30 @@
 # project/app/utils/elements.py
 """
 Фабрики элементов редактора.
+
+id элемента детерминирован: sha256 от ключа документа (sha256 файла),
+позиции элемента в документе и содержимого. Один и тот же файл даёт
+одинаковые id в любом процессе и после перезапуска, а одинаковые абзацы
+в разных местах документа не совпадают.
 """
+import hashlib
+import json
 from typing import Dict, Any
-import base64
+
+
+def element_id(kind: str, doc_key: str, position: str, content: str) -> str:
+    """kind — txt/tbl/img; position — место в документе, например '3:12' (страница:строка)."""
+    content_digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    digest = hashlib.sha256(f"{doc_key}\0{position}\0{content_digest}".encode()).hexdigest()
+    return f"auto_{kind}_{digest[:16]}"
 
 
 def make_text_element(
-    x: int, y: int, width: int, height: int, content: str, **kw
+    x: int, y: int, width: int, height: int, content: str, doc_key: str = "", position: str = "", **kw
 ) -> Dict[str, Any]:
     """Создаёт текстовый элемент."""
     return {
-        "id": f"auto_txt_{abs(hash(content))}",
+        "id": element_id("txt", doc_key, position, content),
         "type": "text",
         "x": x,
         "y": y,
@@ -31,12 +44,12 @@ def make_text_element(
     }
 
 
-def make_table_element(x: int, y: int, width: int, height: int, table) -> Dict[str, Any]:
-    """table: python-docx Table."""
-    rows, cols = len(table.rows), len(table.columns)
-    data = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+def make_table_element(
+    x: int, y: int, width: int, height: int, data, cols: int, doc_key: str = "", position: str = ""
+) -> Dict[str, Any]:
+    """data: строки таблицы — списки текстов ячеек (как row.cells у python-docx)."""
     return {
-        "id": f"auto_tbl_{abs(id(table))}",
+        "id": element_id("tbl", doc_key, position, json.dumps(data, ensure_ascii=False)),
         "type": "table",
         "x": x,
         "y": y,
@@ -44,7 +57,7 @@ def make_table_element(x: int, y: int, width: int, height: int, table) -> Dict[s
         "height": height,
         "zIndex": 0,
         "properties": {
-            "rows": rows,
+            "rows": len(data),
             "cols": cols,
             "borderWidth": 1,
             "borderColor": "#1a1a1a",
@@ -54,11 +67,12 @@ def make_table_element(x: int, y: int, width: int, height: int, table) -> Dict[s
     }
 
 
-def make_image_element(x: int, y: int, width: int, height: int, image_bytes: bytes, ext: str) -> Dict[str, Any]:
-    b64 = base64.b64encode(image_bytes).decode()
-    src = f"data:image/{ext};base64,{b64}"
+def make_image_element(
+    x: int, y: int, width: int, height: int, src: str, digest: str, doc_key: str = "", position: str = ""
+) -> Dict[str, Any]:
+    """src — URL картинки в хранилище, digest — её sha256."""
     return {
-        "id": f"auto_img_{abs(hash(b64))}",
+        "id": element_id("img", doc_key, position, digest),
         "type": "image",
         "x": x,
         "y": y,
@@ -66,4 +80,4 @@ def make_image_element(x: int, y: int, width: int, height: int, image_bytes: byt
         "height": height,
         "zIndex": 0,
         "properties": {"src": src, "alt": "imported"},
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,123 @@
+# project/app/utils/images.py
+"""
+Подготовка картинок из импортируемых документов.
+
+Картинка декодируется сразу в уменьшенном виде (draft у JPEG, reduce у
+остальных форматов) до размера отображения × RETINA_FACTOR и пережимается:
+JPEG для непрозрачных, PNG для картинок с прозрачностью. Оригинал
+остаётся, если он и так не больше результата, если его попросили или если
+уменьшить/пережать картинку не удалось.
+"""
+from __future__ import annotations
+
+import io
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from django.conf import settings
+from PIL import Image as PILImage, ImageOps
+
+DISPLAY_MAX_WIDTH = 250  # px, ширина картинки в редакторе
+
+# форматы, которые Pillow умеет декодировать целиком (EMF/WMF — нет)
+_RASTER_FORMATS = {"jpeg", "png", "gif", "bmp", "tiff", "webp"}
+_SWAPPED_ORIENTATIONS = {5, 6, 7, 8}
+# режимы, которые понимают reduce/LANCZOS; палитра (P), 1, I, I;16 — нет
+_RESAMPLE_MODES = {"L", "LA", "RGB", "RGBA"}
+
+
+def prepare_image(blob: bytes) -> Dict[str, Any]:
+    """
+    Возвращает {'data', 'ext', 'width', 'height', 'source_ext'}: width/height —
+    размер отображения, data — уменьшенные и пережатые байты (или исходные).
+    """
+    img = PILImage.open(io.BytesIO(blob))
+    ext = img.format.lower()
+    w, h = img.size
+    orientation = img.getexif().get(0x0112)
+    if orientation in _SWAPPED_ORIENTATIONS:
+        w, h = h, w
+
+    scale = min(DISPLAY_MAX_WIDTH, w) / w
+    width, height = int(w * scale), int(h * scale)
+    result = {"data": blob, "ext": ext, "width": width, "height": height, "source_ext": ext}
+
+    if ext not in _RASTER_FORMATS or getattr(img, "n_frames", 1) > 1:
+        return result  # векторные и анимированные не трогаем
+
+    retina = getattr(settings, "PARSE_IMAGE_RETINA_FACTOR", 2)
+    target_w = min(w, max(1, math.ceil(width * retina)))
+    target_h = min(h, max(1, math.ceil(height * retina)))
+    if orientation in _SWAPPED_ORIENTATIONS:
+        draft_size = (target_h, target_w)
+    else:
+        draft_size = (target_w, target_h)
+
+    try:
+        data, out_ext = _downscale(img, ext, (target_w, target_h), draft_size)
+    except Exception:
+        return result  # картинка читается, но не пережимается — оставляем исходную
+    if len(data) < len(blob):
+        result.update(data=data, ext=out_ext)
+    return result
+
+
+def _downscale(img: PILImage.Image, ext: str, target, draft_size):
+    target_w, target_h = target
+    if ext == "jpeg":
+        # DCT-масштабирование 1/2..1/8 прямо при декодировании
+        img.draft("RGB" if img.mode not in ("L", "CMYK") else img.mode, draft_size)
+    img = ImageOps.exif_transpose(img)
+
+    if img.size != (target_w, target_h) and img.mode not in _RESAMPLE_MODES:
+        img = img.convert("RGBA" if _has_alpha(img) else "RGB")
+    factor = min(img.width // target_w, img.height // target_h)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != (target_w, target_h):
+        img = img.resize((target_w, target_h), PILImage.LANCZOS)
+
+    return _encode(img)
+
+
+def _has_alpha(img: PILImage.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _encode(img: PILImage.Image):
+    out = io.BytesIO()
+    if _has_alpha(img):
+        img.save(out, "PNG", optimize=True)
+        return out.getvalue(), "png"
+
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.save(
+        out,
+        "JPEG",
+        quality=getattr(settings, "PARSE_IMAGE_JPEG_QUALITY", 82),
+        optimize=True,
+        progressive=True,
+    )
+    return out.getvalue(), "jpeg"
+
+
+def prepare_images(blobs: List[bytes]) -> List[Dict[str, Any] | None]:
+    """
+    prepare_image для всех картинок документа, в исходном порядке;
+    None — картинку не удалось прочитать. Декодирование и сжатие в Pillow
+    отпускают GIL, поэтому при большом числе картинок хватает потоков.
+    """
+    workers = getattr(settings, "PARSE_IMAGE_WORKERS", 4)
+    if workers <= 1 or len(blobs) < getattr(settings, "PARSE_IMAGE_PARALLEL_MIN", 4):
+        return [_safe_prepare(blob) for blob in blobs]
+    with ThreadPoolExecutor(max_workers=min(workers, len(blobs))) as executor:
+        return list(executor.map(_safe_prepare, blobs))
+
+
+def _safe_prepare(blob: bytes) -> Dict[str, Any] | None:
+    try:
+        return prepare_image(blob)
+    except Exception:
+        return None
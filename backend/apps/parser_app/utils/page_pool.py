@@ -0,0 +1,130 @@
+# project/app/utils/page_pool.py
+"""
+Параллельный разбор больших PDF по диапазонам страниц.
+
+Каждый процесс пула сам открывает файл по пути (временному, если загрузка
+была в памяти) и обрабатывает свой диапазон; результаты собираются строго
+по порядку страниц.
+"""
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def parallel_workers() -> int:
+    return getattr(settings, "PDF_PARALLEL_WORKERS", None) or os.cpu_count() or 1
+
+
+def should_parallelize(page_count: int) -> bool:
+    return parallel_workers() > 1 and page_count >= getattr(settings, "PDF_PARALLEL_MIN_PAGES", 40)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: WSGI-процесс многопоточный, fork унаследовал бы чужие блокировки
+            _executor = ProcessPoolExecutor(
+                max_workers=parallel_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def bounded_ranges(start: int, stop: int) -> Iterator[Tuple[int, int]]:
+    """[start, stop) кусками по PDF_REOPEN_EVERY_PAGES (0 — одним куском)."""
+    size = getattr(settings, "PDF_REOPEN_EVERY_PAGES", 50) or max(stop - start, 1)
+    for range_start in range(start, stop, size):
+        yield range_start, min(range_start + size, stop)
+
+
+def page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    """
+    [start, stop) диапазоны; с запасом по числу, чтобы выровнять нагрузку,
+    и не длиннее PDF_REOPEN_EVERY_PAGES — воркер держит диапазон открытым целиком.
+    """
+    size = max(4, math.ceil(page_count / (workers * 3)))
+    reopen_every = getattr(settings, "PDF_REOPEN_EVERY_PAGES", 50)
+    if reopen_every:
+        size = min(size, max(4, reopen_every))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+@contextmanager
+def local_path(file_obj) -> Iterator[str]:
+    """Путь к файлу на диске: существующий или временная копия загрузки."""
+    if isinstance(file_obj, (str, os.PathLike)):
+        yield os.fspath(file_obj)
+        return
+    if hasattr(file_obj, "temporary_file_path"):
+        yield file_obj.temporary_file_path()
+        return
+    try:
+        # FieldFile на локальном хранилище
+        path = file_obj.path
+    except (AttributeError, NotImplementedError, ValueError):
+        path = None
+    if path and os.path.exists(path):
+        yield path
+        return
+
+    if hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(file_obj, tmp)
+    try:
+        yield tmp.name
+    finally:
+        os.unlink(tmp.name)
+        if hasattr(file_obj, "seek"):
+            file_obj.seek(0)
+
+
+def iter_page_ranges(
+    path: str,
+    page_count: int,
+    worker: Callable[[str, int, int], List[Any]],
+) -> Iterator[Any]:
+    """
+    Запускает worker(path, start, stop) по диапазонам в пуле процессов и
+    отдаёт результаты постранично в исходном порядке.
+    worker должен быть функцией уровня модуля без зависимостей от Django.
+    """
+    workers = parallel_workers()
+    ranges = iter(page_ranges(page_count, workers))
+    pending: "deque[Future]" = deque()
+    try:
+        # в работе и в ожидании не больше 2 диапазонов на процесс
+        for start, stop in ranges:
+            pending.append(_get_executor().submit(worker, path, start, stop))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        # упавший процесс ломает пул целиком — следующий вызов поднимет новый
+        _reset_executor()
+        raise
@@ -1,16 +1,88 @@
 # project/app/utils/parser.py
 from __future__ import annotations
 
-from typing import Dict, Any
+import hashlib
+from typing import Dict, Any, Iterator
 
-from .docx_parser import parse_docx
-from .pdf_parser import parse_pdf
+from .docx_parser import extract_docx_text, iter_docx_pages, iter_docx_text_pages, parse_docx
+from .docx_xml import count_docx_pages
+from .pdf_parser import count_pdf_pages, parse_pdf, iter_pdf_pages
 
+# Увеличивать при любом изменении результата парсинга: старые записи
+# ParsedDocument перестанут переиспользоваться для повторных загрузок.
+PARSER_VERSION = "5"
 
-def parse_file(file_obj, ext: str) -> Dict[str, Any]:
-    """Унифицированный вход для обеих библиотек."""
+# Уровни детализации: text — только текст (быстрый путь, без элементов),
+# lines — строки одна под другой (по умолчанию), layout — строки на своих
+# местах страницы PDF с кеглем и жирностью (для DOCX совпадает с lines).
+FIDELITY_LEVELS = ("text", "lines", "layout")
+DEFAULT_FIDELITY = "lines"
+
+
+def parse_file(
+    file_obj, ext: str, fidelity: str = DEFAULT_FIDELITY, keep_original_images: bool = False,
+    doc_key: str = "",
+) -> Dict[str, Any]:
+    """
+    Унифицированный вход для обеих библиотек.
+    doc_key — sha256 файла для id элементов; если не передан, считается здесь.
+    """
+    if ext == "docx":
+        if fidelity == "text":
+            return {"elements": [], "text": extract_docx_text(file_obj)}
+        return parse_docx(file_obj, keep_original_images=keep_original_images,
+                          doc_key=doc_key or file_sha256(file_obj))
+    if ext == "pdf":
+        return parse_pdf(file_obj, fidelity, doc_key or file_sha256(file_obj))
+    raise ValueError("Unsupported extension")
+
+
+def file_sha256(file_obj) -> str:
+    """sha256 содержимого файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file_obj.read(1024 * 1024), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def count_pages(file_obj, ext: str) -> int | None:
+    """
+    Настоящее число страниц документа без разбора содержимого
+    (дерево страниц PDF, разрывы страниц в разметке DOCX).
+    """
+    if ext == "docx":
+        return count_docx_pages(file_obj)
+    if ext == "pdf":
+        return count_pdf_pages(file_obj)
+    return None
+
+
+def parser_version(fidelity: str = DEFAULT_FIDELITY, keep_original_images: bool = False) -> str:
+    """Версия результата для кэша разбора: уровень и оригиналы картинок её меняют."""
+    version = PARSER_VERSION
+    if fidelity != DEFAULT_FIDELITY:
+        version += f"+{fidelity}"
+    if keep_original_images:
+        version += "+originals"
+    return version
+
+
+def iter_file_pages(
+    file_obj, ext: str, fidelity: str = DEFAULT_FIDELITY, keep_original_images: bool = False,
+    doc_key: str = "",
+) -> Iterator[Dict[str, Any]]:
+    """
+    Постраничный вариант parse_file: {'page', 'elements', 'text'} на страницу.
+    DOCX делится на страницы по разрывам в разметке (см. iter_docx_pages).
+    """
     if ext == "docx":
-        return parse_docx(file_obj)
+        if fidelity == "text":
+            yield from iter_docx_text_pages(file_obj)
+        else:
+            yield from iter_docx_pages(file_obj, keep_original_images, doc_key or file_sha256(file_obj))
+        return
     if ext == "pdf":
-        return parse_pdf(file_obj)
-    raise ValueError("Unsupported extension")
\ No newline at end of file
+        yield from iter_pdf_pages(file_obj, fidelity, doc_key or file_sha256(file_obj))
+        return
+    raise ValueError("Unsupported extension")
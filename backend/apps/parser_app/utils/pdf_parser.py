@@ -1,49 +1,232 @@
 # project/app/utils/pdf_parser.py
 from __future__ import annotations
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 import pdfplumber
+from PyPDF2 import PasswordType, PdfReader
 
 from .elements import make_text_element
+from .page_pool import bounded_ranges, iter_page_ranges, local_path, should_parallelize
 
 
-def parse_pdf(file_obj) -> Dict[str, Any]:
+def parse_pdf(file_obj, fidelity: str = "lines", doc_key: str = "") -> Dict[str, Any]:
     """
     Парсит PDF в элементы редактора.
     Возвращает {'elements': List[Element], 'text': str}
     """
     elements: List[Dict[str, Any]] = []
+    plain_pages = []
+
+    for page in iter_pdf_pages(file_obj, fidelity, doc_key):
+        elements.extend(page["elements"])
+        if page["text"]:
+            plain_pages.append(page["text"])
+
+    return {"elements": elements, "text": "\n".join(plain_pages)}
+
+
+def iter_pdf_pages(file_obj, fidelity: str = "lines", doc_key: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Постраничный парсинг: отдаёт {'page': int, 'elements': List[Element], 'text': str}
+    сразу после разбора каждой страницы, не накапливая документ целиком.
+    Большие PDF разбираются параллельно в пуле процессов (см. page_pool.py).
+
+    fidelity: 'text' — только текст через PyPDF2, без геометрии и элементов;
+    'lines' — строки одна под другой; 'layout' — строки на своих местах
+    страницы с размером и жирностью шрифта.
+    doc_key — sha256 файла для id элементов (см. elements.py).
+    """
+    if fidelity == "text":
+        yield from _iter_text_pages(file_obj)
+        return
+    if fidelity == "layout":
+        yield from _iter_layout_pages(file_obj, doc_key)
+        return
+
     y_offset = 40
     page_w = 794
-    plain_lines = []
-
-    with pdfplumber.open(file_obj) as pdf:
-        for page in pdf.pages:
-            words = page.extract_words()
-            if not words:
-                continue
-            # группируем по строкам
-            lines = {}
-            for w in words:
-                key = int(float(w["top"]))
-                lines.setdefault(key, []).append(w)
-
-            for top in sorted(lines):
-                line_words = sorted(lines[top], key=lambda x: float(x["x0"]))
-                text = " ".join(w["text"] for w in line_words)
-                plain_lines.append(text)
-                h = 18
-                elements.append(
-                    make_text_element(
-                        x=40,
-                        y=y_offset,
-                        width=page_w - 80,
-                        height=h,
-                        content=text,
-                    )
+
+    for page_number, lines in enumerate(_iter_pages(file_obj, _page_lines, extract_page_lines), start=1):
+        elements: List[Dict[str, Any]] = []
+        for line_number, text in enumerate(lines):
+            h = 18
+            elements.append(
+                make_text_element(
+                    x=40,
+                    y=y_offset,
+                    width=page_w - 80,
+                    height=h,
+                    content=text,
+                    doc_key=doc_key,
+                    position=f"{page_number}:{line_number}",
                 )
-                y_offset += h + 4
+            )
+            y_offset += h + 4
+        if lines:
             y_offset += 20  # отступ между страницами
 
-    return {"elements": elements, "text": "\n".join(plain_lines)}
\ No newline at end of file
+        yield {"page": page_number, "elements": elements, "text": "\n".join(lines)}
+
+
+def count_pdf_pages(file_obj) -> int:
+    """
+    Число страниц по дереву страниц (/Pages → /Kids): PyPDF2 не трогает
+    содержимое, шрифты и ресурсы — в разы дешевле pdfplumber.open().
+    """
+    try:
+        count = len(PdfReader(file_obj).pages)
+    except Exception:
+        # дерево страниц битое — pdfminer умеет восстанавливать его перебором объектов
+        if hasattr(file_obj, "seek"):
+            file_obj.seek(0)
+        with pdfplumber.open(file_obj) as pdf:
+            count = len(pdf.pages)
+    if hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    return count
+
+
+def _iter_text_pages(file_obj) -> Iterator[Dict[str, Any]]:
+    # PyPDF2 не считает геометрию каждого символа — в разы быстрее pdfplumber.
+    # Reader тоже копит разобранные объекты, поэтому пересоздаётся каждые N страниц.
+    page_count = count_pdf_pages(file_obj)
+    if _open_text_reader(file_obj) is None:
+        # PyPDF2 не открыл PDF (обычно зашифрованный) — тот же текст через pdfplumber
+        for page_number, lines in enumerate(_iter_pages(file_obj, _page_lines, extract_page_lines), start=1):
+            yield {"page": page_number, "elements": [], "text": "\n".join(lines)}
+        return
+
+    for start, stop in bounded_ranges(0, page_count):
+        reader = _open_text_reader(file_obj)
+        for index in range(start, stop):
+            text = (reader.pages[index].extract_text() or "").strip()
+            yield {"page": index + 1, "elements": [], "text": text}
+
+
+def _open_text_reader(file_obj) -> PdfReader | None:
+    """
+    PdfReader для уровня text. Зашифрованный PDF открывается пустым паролем
+    (как в pdfminer); None — если PyPDF2 не смог его расшифровать (пароль,
+    неподдерживаемый обработчик или шифр).
+    """
+    try:
+        reader = PdfReader(file_obj)
+        if reader.is_encrypted:
+            if reader.decrypt("") == PasswordType.NOT_DECRYPTED:
+                return None
+            if len(reader.pages):
+                reader.pages[0].extract_text()  # шифр потоков проверяется только при чтении
+    except Exception:
+        return None
+    finally:
+        if hasattr(file_obj, "seek"):
+            file_obj.seek(0)
+    return reader
+
+
+def _iter_layout_pages(file_obj, doc_key: str) -> Iterator[Dict[str, Any]]:
+    y_offset = 40
+    page_w = 794
+
+    for page_number, layout in enumerate(_iter_pages(file_obj, _page_layout, extract_page_layouts), start=1):
+        scale = page_w / layout["width"]
+        elements: List[Dict[str, Any]] = []
+        for line_number, line in enumerate(layout["lines"]):
+            elements.append(
+                make_text_element(
+                    x=round(line["x0"] * scale),
+                    y=y_offset + round(line["top"] * scale),
+                    width=max(1, round((line["x1"] - line["x0"]) * scale)),
+                    height=max(1, round((line["bottom"] - line["top"]) * scale)),
+                    content=line["text"],
+                    size=max(1, round(line["size"] * scale)),
+                    bold=line["bold"],
+                    doc_key=doc_key,
+                    position=f"{page_number}:{line_number}",
+                )
+            )
+        y_offset += round(layout["height"] * scale) + 20
+
+        text = "\n".join(line["text"] for line in layout["lines"])
+        yield {"page": page_number, "elements": elements, "text": text}
+
+
+def _iter_pages(file_obj, page_fn, worker) -> Iterator[Any]:
+    """page_fn(page) каждой страницы — последовательно или по диапазонам в пуле (worker)."""
+    page_count = count_pdf_pages(file_obj)
+    if should_parallelize(page_count):
+        with local_path(file_obj) as path:
+            yield from iter_page_ranges(path, page_count, worker)
+        return
+
+    yield from _read_pages(file_obj, bounded_ranges(0, page_count), page_fn)
+
+
+def _read_pages(source, ranges, page_fn) -> Iterator[Any]:
+    """
+    page_fn для страниц из диапазонов [start, stop) с ограниченной памятью:
+    кэш каждой страницы pdfplumber сбрасывается сразу после обработки, а
+    PDF открывается заново на каждый диапазон — pdfminer держит все
+    разобранные объекты документа, пока тот открыт.
+    """
+    for range_start, range_stop in ranges:
+        with pdfplumber.open(source, pages=range(range_start + 1, range_stop + 1)) as pdf:
+            for page in pdf.pages:
+                try:
+                    yield page_fn(page)
+                finally:
+                    page.close()
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def extract_page_lines(path: str, start: int, stop: int) -> List[List[str]]:
+    """Воркер пула: строки страниц [start, stop)."""
+    return list(_read_pages(path, [(start, stop)], _page_lines))
+
+
+def extract_page_layouts(path: str, start: int, stop: int) -> List[Dict[str, Any]]:
+    """Воркер пула: строки с геометрией для страниц [start, stop)."""
+    return list(_read_pages(path, [(start, stop)], _page_layout))
+
+
+def _page_lines(page) -> List[str]:
+    words = page.extract_words()
+    if not words:
+        return []
+    # группируем по строкам
+    lines = {}
+    for w in words:
+        key = int(float(w["top"]))
+        lines.setdefault(key, []).append(w)
+
+    result = []
+    for top in sorted(lines):
+        line_words = sorted(lines[top], key=lambda x: float(x["x0"]))
+        result.append(" ".join(w["text"] for w in line_words))
+    return result
+
+
+def _page_layout(page) -> Dict[str, Any]:
+    """Строки страницы с bbox (в пунктах PDF), кеглем и жирностью первого слова."""
+    words = page.extract_words(extra_attrs=["size", "fontname"])
+    lines = {}
+    for w in words:
+        key = int(float(w["top"]))
+        lines.setdefault(key, []).append(w)
+
+    result = []
+    for top in sorted(lines):
+        line_words = sorted(lines[top], key=lambda x: float(x["x0"]))
+        first = line_words[0]
+        result.append({
+            "text": " ".join(w["text"] for w in line_words),
+            "x0": float(first["x0"]),
+            "x1": max(float(w["x1"]) for w in line_words),
+            "top": min(float(w["top"]) for w in line_words),
+            "bottom": max(float(w["bottom"]) for w in line_words),
+            "size": float(first["size"]),
+            "bold": "bold" in first["fontname"].lower(),
+        })
+    return {"width": float(page.width), "height": float(page.height), "lines": result}
@@ -1,50 +1,268 @@
 # project/app/views.py
+import json
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.http import require_safe
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
-from .models import ParsedDocument
-from .serializers import ParsedDocumentSerializer, ParseUploadSerializer
-from .utils.parser import parse_file
+from .image_store import CONTENT_TYPES, IMAGE_NAME_RE, image_path
+from .jobs import request_cancel
+from .models import ParsedDocument, ParseJob
+from .pagination import ElementCursor, InvalidQuery, parse_page_range
+from .parsing import DocumentParse, copy_pages, save_pages
+from .serializers import ParsedDocumentSerializer, ParseJobSerializer, ParseUploadSerializer
+from .upload_handlers import Sha256UploadHandler
+from .utils.parser import DEFAULT_FIDELITY, FIDELITY_LEVELS, count_pages, iter_file_pages, parser_version
+
+
+def _ndjson(payload) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
 
 
 @api_view(['POST'])
 @parser_classes([MultiPartParser])
 def parse_document(request):
+    # sha256 считается на лету, пока загрузка читается из запроса
+    hasher = Sha256UploadHandler(request)
+    request.upload_handlers.insert(0, hasher)
+
     serializer = ParseUploadSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
     uploaded_file = serializer.validated_data['file']
     filename = uploaded_file.name
     ext = filename.lower().split('.')[-1]
+    content_sha256 = hasher.digests.get('file', '')
+    stream = request.query_params.get('stream') in ('1', 'true')
+    run_async = request.query_params.get('async') in ('1', 'true')
+    # по умолчанию картинки уменьшаются; оригиналы — только по запросу
+    keep_original_images = request.query_params.get('keep_original_images') in ('1', 'true')
+    fidelity = request.query_params.get('fidelity', DEFAULT_FIDELITY)
+    if fidelity not in FIDELITY_LEVELS:
+        return Response({'error': f'fidelity must be one of: {", ".join(FIDELITY_LEVELS)}.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    version = parser_version(fidelity, keep_original_images)
+
+    cached = _find_parsed_duplicate(content_sha256, ext, version)
+    if cached is not None:
+        parsed_doc = _reuse_parsed_document(cached, filename)
+        if run_async:
+            job = ParseJob.objects.create(
+                document=parsed_doc,
+                status=ParseJob.STATUS_DONE,
+                content_sha256=content_sha256,
+                fidelity=fidelity,
+                keep_original_images=keep_original_images,
+                finished_at=parsed_doc.created_at,
+            )
+            return Response(ParseJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        if stream:
+            return _stream_parsed_document(request, parsed_doc)
+        return Response(ParsedDocumentSerializer(parsed_doc, context={'request': request}).data,
+                        status=status.HTTP_201_CREATED)
+
+    if run_async:
+        return _enqueue_parse_document(uploaded_file, ext, content_sha256, fidelity, keep_original_images)
+    if stream:
+        return _stream_parse_document(request, uploaded_file, ext, content_sha256, fidelity, keep_original_images)
 
     try:
-        data = parse_file(uploaded_file, ext)
-        page_count = len(data['elements']) // 30 or None  # приблизительно
+        pages = list(iter_file_pages(uploaded_file, ext, fidelity, keep_original_images, content_sha256))
     except Exception as e:
         return Response({'error': f'Failed to parse document: {str(e)}'},
                         status=status.HTTP_400_BAD_REQUEST)
 
     uploaded_file.seek(0)  # важно перед сохранением файла
 
-    parsed_doc = ParsedDocument.objects.create(
-        original_filename=filename,
+    with transaction.atomic():
+        parsed_doc = ParsedDocument.objects.create(
+            original_filename=filename,
+            file_type=ext.upper(),
+            file_size=uploaded_file.size,
+            page_count=len(pages),
+            extracted_text='\n'.join(page['text'] for page in pages if page['text']),
+            original_file=uploaded_file,
+            content_sha256=content_sha256,
+            parser_version=version,
+        )
+        save_pages(parsed_doc, pages)
+
+    return Response(ParsedDocumentSerializer(parsed_doc, context={'request': request}).data,
+                    status=status.HTTP_201_CREATED)
+
+
+def _find_parsed_duplicate(content_sha256, ext, version):
+    if not content_sha256:
+        return None
+    return (
+        ParsedDocument.objects
+        .filter(content_sha256=content_sha256, parser_version=version, file_type=ext.upper())
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def _reuse_parsed_document(source, filename):
+    """Повторная загрузка: новая запись с готовым разбором и тем же файлом в media."""
+    with transaction.atomic():
+        parsed_doc = ParsedDocument.objects.create(
+            original_filename=filename,
+            file_type=source.file_type,
+            file_size=source.file_size,
+            page_count=source.page_count,
+            extracted_text=source.extracted_text,
+            editor_json=source.editor_json,
+            original_file=source.original_file.name,
+            content_sha256=source.content_sha256,
+            parser_version=source.parser_version,
+        )
+        copy_pages(source, parsed_doc)
+    return parsed_doc
+
+
+def _stream_parsed_document(request, parsed_doc):
+    """NDJSON-ответ для уже разобранного документа — тот же формат, что и при разборе."""
+    def stream():
+        document = ParsedDocumentSerializer(parsed_doc, context={'request': request}).data
+        yield _ndjson({'type': 'document', **document})
+        for page in parsed_doc.get_pages():
+            yield _ndjson({'type': 'page', **page})
+        yield _ndjson({'type': 'done', 'id': parsed_doc.pk, 'page_count': parsed_doc.page_count})
+
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson',
+                                 status=status.HTTP_201_CREATED)
+
+
+def _stream_parse_document(request, uploaded_file, ext, content_sha256='', fidelity=DEFAULT_FIDELITY,
+                           keep_original_images=False):
+    """
+    POST /api/parse/?stream=1 — NDJSON по мере разбора:
+    {"type": "document", ...}, затем {"type": "page", ...} на каждую страницу
+    и в конце {"type": "done", ...} (или {"type": "error", ...}).
+    Документ создаётся сразу и дописывается в БД по ходу разбора (см. parsing.py).
+    """
+    parsed_doc = _create_pending_document(uploaded_file, ext)
+    parse = DocumentParse(parsed_doc, content_sha256, fidelity, keep_original_images)
+
+    def stream():
+        document = ParsedDocumentSerializer(parsed_doc, context={'request': request}).data
+        yield _ndjson({'type': 'document', **document})
+
+        try:
+            for page in parse.pages():
+                yield _ndjson({'type': 'page', **page})
+        except Exception as e:
+            yield _ndjson({'type': 'error', 'id': parsed_doc.pk, 'error': f'Failed to parse document: {str(e)}'})
+            return
+
+        yield _ndjson({'type': 'done', 'id': parsed_doc.pk, 'page_count': parse.page_count})
+
+    response = StreamingHttpResponse(stream(), content_type='application/x-ndjson',
+                                     status=status.HTTP_201_CREATED)
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен копить ответ целиком
+    return response
+
+
+def _enqueue_parse_document(uploaded_file, ext, content_sha256='', fidelity=DEFAULT_FIDELITY,
+                            keep_original_images=False):
+    """POST /api/parse/?async=1 — сохраняет файл и ставит разбор в очередь (manage.py parse_worker)."""
+    job = ParseJob.objects.create(
+        document=_create_pending_document(uploaded_file, ext),
+        content_sha256=content_sha256,
+        fidelity=fidelity,
+        keep_original_images=keep_original_images,
+    )
+    return Response(ParseJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+def _create_pending_document(uploaded_file, ext):
+    """Запись до разбора: число страниц известно сразу, элементы появятся по ходу."""
+    try:
+        page_count = count_pages(uploaded_file, ext)
+    except Exception:
+        page_count = None  # битый файл — ошибку вернёт сам разбор
+    uploaded_file.seek(0)
+    return ParsedDocument.objects.create(
+        original_filename=uploaded_file.name,
         file_type=ext.upper(),
         file_size=uploaded_file.size,
         page_count=page_count,
-        extracted_text=data['text'],
-        editor_json={'elements': data['elements']},
+        extracted_text='',
+        editor_json={'elements': []},
         original_file=uploaded_file
     )
 
-    return Response(ParsedDocumentSerializer(parsed_doc, context={'request': request}).data,
-                    status=status.HTTP_201_CREATED)
-
 
 @api_view(['GET'])
 def get_parsed_document(request, pk):
+    """
+    GET /api/parse/{id}/ — документ без элементов.
+    ?pages=10-20 (или ?pages=5) — добавляет эти страницы целиком;
+    ?cursor=...&limit=N — следующая порция элементов по всему документу.
+    """
     parsed_doc = get_object_or_404(ParsedDocument, pk=pk)
-    serializer = ParsedDocumentSerializer(parsed_doc, context={'request': request})
-    return Response(serializer.data)
\ No newline at end of file
+    data = ParsedDocumentSerializer(parsed_doc, context={'request': request}).data
+
+    try:
+        if 'pages' in request.query_params:
+            first, last = parse_page_range(request.query_params['pages'])
+            data['total_pages'] = parsed_doc.stored_page_count()
+            data['pages'] = parsed_doc.get_pages(first, last)
+        elif 'cursor' in request.query_params or 'limit' in request.query_params:
+            cursor = ElementCursor.from_query(request.query_params)
+            data['elements'], data['next_cursor'] = cursor.read(parsed_doc)
+    except InvalidQuery as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(data)
+
+
+@require_safe
+def get_parsed_image(request, name):
+    """
+    GET /api/parse/images/<sha256>.<ext> — картинка из разобранного документа.
+    Имя — хэш содержимого, поэтому ответ неизменяем и кэшируется навсегда.
+    """
+    match = IMAGE_NAME_RE.match(name)
+    if not match:
+        raise Http404
+    digest, ext = match.group('digest'), match.group('ext')
+    etag = f'"{digest}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=31536000, immutable',
+    }
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            f = default_storage.open(image_path(digest, ext), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(f, content_type=CONTENT_TYPES.get(ext, 'application/octet-stream'))
+
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+@api_view(['GET'])
+def get_parse_job(request, pk):
+    job = get_object_or_404(ParseJob, pk=pk)
+    return Response(ParseJobSerializer(job).data)
+
+
+@api_view(['POST'])
+def cancel_parse_job(request, pk):
+    job = get_object_or_404(ParseJob, pk=pk)
+    if job.status in ParseJob.FINISHED_STATUSES:
+        return Response({'error': f'Job is already {job.status.lower()}.'}, status=status.HTTP_409_CONFLICT)
+    job = request_cancel(job)
+    return Response(ParseJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
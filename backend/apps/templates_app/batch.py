@@ -0,0 +1,251 @@
+"""
+Пакетный рендер (mail merge): много наборов значений по одному шаблону.
+
+DOCX рендерится в общем пуле процессов — каждый процесс один раз разбирает
+шаблон (PreparedDocx) и дальше только подставляет значения.
+HTML уходит в общий пул Chromium, который и так работает параллельно.
+Результаты отдаются строго в порядке входных данных.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from apps.common.caching import LRUCache
+
+from .docx_cache import PreparedDocx, get_prepared_docx
+from .html_engine import get_compiled_html_template
+from .pdf_pool import get_browser_pool
+
+BATCH_ERRORS_NAME = "ERRORS.txt"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# в процессе пула: разобранные шаблоны по sha256 файла
+_worker_templates = LRUCache(max_entries=getattr(settings, "RENDER_BATCH_WORKER_TEMPLATES", 8))
+
+
+def batch_workers() -> int:
+    return getattr(settings, "RENDER_BATCH_WORKERS", None) or os.cpu_count() or 1
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: WSGI-процесс многопоточный, fork унаследовал бы чужие блокировки
+            _executor = ProcessPoolExecutor(
+                max_workers=batch_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _render_docx_in_worker(digest: str, path: str, values: Dict[str, Any]) -> bytes:
+    """Файл шаблона читается с диска только при первом задании с этим digest в процессе."""
+    prepared = _worker_templates.get(digest)
+    if prepared is None:
+        with open(path, "rb") as f:
+            prepared = PreparedDocx(f.read())
+        _worker_templates.set(digest, prepared)
+    return _render_prepared_docx(prepared, values)
+
+
+def _render_prepared_docx(prepared: PreparedDocx, values: Dict[str, Any]) -> bytes:
+    doc = prepared.new_template()
+    doc.render(values or {})
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _ordered_results(submit: Callable[[Any], Future], items: Iterable[Any], window: int,
+                     wait: Callable[[Future], Any]) -> Iterator[Any]:
+    """Держит в работе не больше window заданий и отдаёт результаты по порядку."""
+    pending: "deque[Future]" = deque()
+    try:
+        for item in items:
+            pending.append(submit(item))
+            if len(pending) >= window:
+                yield wait(pending.popleft())
+        while pending:
+            yield wait(pending.popleft())
+    finally:
+        # ответ прерван (клиент ушёл, ошибка) — не занимаем общий пул чужой работой
+        for future in pending:
+            future.cancel()
+
+
+def iter_rendered_docx(template, items: List[Dict[str, Any]]) -> Iterator[bytes]:
+    prepared = get_prepared_docx(template)
+    workers = batch_workers()
+    if workers <= 1 or len(items) < getattr(settings, "RENDER_BATCH_PARALLEL_MIN_ITEMS", 16):
+        for values in items:
+            yield _render_prepared_docx(prepared, values)
+        return
+
+    # процессы пула читают шаблон из временного файла, а не получают байты с каждым заданием
+    digest = hashlib.sha256(prepared.blob).hexdigest()
+    with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
+        tmp.write(prepared.blob)
+    try:
+        yield from _ordered_results(
+            lambda values: _get_executor().submit(_render_docx_in_worker, digest, tmp.name, values),
+            items,
+            window=workers * 4,
+            wait=lambda future: future.result(),
+        )
+    except BrokenProcessPool:
+        # упавший процесс ломает пул целиком — следующий вызов поднимет новый
+        _reset_executor()
+        raise
+    finally:
+        os.unlink(tmp.name)
+
+
+def iter_rendered_html_pdf(template, items: List[Dict[str, Any]], base_url: str) -> Iterator[bytes]:
+    compiled = get_compiled_html_template(template)
+    pool = get_browser_pool()
+    yield from _ordered_results(
+        lambda values: pool.submit(compiled.render(values), base_url),
+        items,
+        window=pool.size * 2,
+        wait=pool.wait,
+    )
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Неперематываемый поток: zipfile пишет в него, а мы забираем готовые байты."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, bytes]], compress: bool) -> Iterator[bytes]:
+    """
+    Потоковый ZIP. Заголовки ответа к этому моменту уже отправлены, поэтому
+    ошибка рендера посередине не обрывает архив: он закрывается корректно,
+    а в конец пишется ERRORS.txt с номером документа и текстом ошибки.
+    """
+    buffer = _ChunkBuffer()
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(buffer, mode="w", compression=compression) as archive:
+        written = 0
+        try:
+            for name, data in entries:
+                archive.writestr(name, data)
+                written += 1
+                chunk = buffer.drain()
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            archive.writestr(
+                BATCH_ERRORS_NAME,
+                f"Rendering stopped at document {written + 1}: {e}\n"
+                f"The archive contains only the first {written} documents.\n",
+            )
+    yield buffer.drain()
+
+
+def merge_pdfs(documents: Iterable[bytes], out) -> None:
+    """
+    Склеивает PDF по одному: объекты каждого документа сразу пишутся в out
+    под новыми номерами, в памяти остаются только смещения объектов (xref)
+    и номера страниц. PdfWriter.append держал бы все страницы до конца.
+    """
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+
+    start = out.tell()
+    offsets: List[int] = [0, 0, 0]  # 0 — свободный, 1 — /Pages, 2 — /Catalog
+    page_ids: List[int] = []
+
+    def write_object(number: int, obj) -> None:
+        offsets[number] = out.tell() - start
+        out.write(b"%d 0 obj\n" % number)
+        obj.write_to_stream(out, None)
+        out.write(b"\nendobj\n")
+
+    out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    for pdf_bytes in documents:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        numbers: Dict[Tuple[int, int], int] = {}
+        queue: "deque[IndirectObject]" = deque()
+
+        def renumber(ref: IndirectObject) -> IndirectObject:
+            key = (ref.idnum, ref.generation)
+            if key not in numbers:
+                numbers[key] = len(offsets)
+                offsets.append(0)
+                queue.append(ref)
+            return IndirectObject(numbers[key], 0, None)
+
+        def remap(obj):
+            if isinstance(obj, IndirectObject):
+                return renumber(obj)
+            if isinstance(obj, StreamObject):
+                copy = StreamObject()
+                copy._data = obj._data  # как есть, со своими /Filter
+                copy.update({key: remap(value) for key, value in obj.items()})
+                return copy
+            if isinstance(obj, DictionaryObject):
+                return DictionaryObject({key: remap(value) for key, value in obj.items()})
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(remap(value) for value in obj)
+            return obj
+
+        # reader.pages уже перенёс в страницы наследуемые /Resources, /MediaBox и т.п.
+        for page in reader.pages:
+            page_ids.append(renumber(page.indirect_reference).idnum)
+        while queue:
+            ref = queue.popleft()
+            obj = ref.get_object()
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+                obj = DictionaryObject({key: value for key, value in obj.items() if key != "/Parent"})
+                obj = remap(obj)
+                obj[NameObject("/Parent")] = IndirectObject(1, 0, None)
+            else:
+                obj = remap(obj)
+            write_object(numbers[(ref.idnum, ref.generation)], obj)
+
+    kids = b" ".join(b"%d 0 R" % number for number in page_ids)
+    offsets[1] = out.tell() - start
+    out.write(b"1 0 obj\n<< /Type /Pages /Kids [%s] /Count %d >>\nendobj\n" % (kids, len(page_ids)))
+    offsets[2] = out.tell() - start
+    out.write(b"2 0 obj\n<< /Type /Catalog /Pages 1 0 R >>\nendobj\n")
+
+    xref = out.tell() - start
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(offsets))
+    for offset in offsets[1:]:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 2 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets), xref))
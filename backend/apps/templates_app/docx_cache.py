@@ -0,0 +1,116 @@
+"""
+Кэш предразобранных DOCX-шаблонов.
+
+DocxTemplate на каждый рендер заново читает zip, парсит XML, патчит
+jinja-теги и компилирует jinja-шаблон тела документа (самая дорогая часть).
+Здесь всё это делается один раз на версию шаблона; на рендер клонируется
+только python-docx документ.
+"""
+import copy
+import io
+import re
+from typing import Any, Dict
+
+from django.conf import settings
+from docx import Document
+from docxtpl import DocxTemplate
+from jinja2 import Template as JinjaTemplate, TemplateError
+
+from apps.common.caching import LRUCache
+
+
+class PreparedDocx:
+    """Неизменяемый исходник: байты файла, разобранный документ и шаблон тела."""
+
+    def __init__(self, blob: bytes):
+        self.blob = blob
+        self.document = Document(io.BytesIO(blob))
+
+        loader = DocxTemplate(io.BytesIO(blob))
+        loader.docx = self.document
+        self.body_xml = loader.patch_xml(loader.get_xml())
+        # та же подготовка, что в DocxTemplate.render_xml_part
+        self.body_source = re.sub(r"<w:p([ >])", r"\n<w:p\1", self.body_xml)
+        try:
+            self.body_template = JinjaTemplate(self.body_source)
+        except TemplateError as exc:
+            _add_docx_context(exc, self.body_source)
+            raise
+
+    @property
+    def weight(self) -> int:
+        # разобранное дерево заметно больше zip-архива
+        return len(self.blob) * 4 + len(self.body_xml)
+
+    def new_template(self) -> "_PreparedDocxTemplate":
+        return _PreparedDocxTemplate(self)
+
+
+class _PreparedDocxTemplate(DocxTemplate):
+    """DocxTemplate поверх клона заранее разобранного документа."""
+
+    def __init__(self, prepared: PreparedDocx):
+        super().__init__(io.BytesIO(prepared.blob))
+        self.docx = copy.deepcopy(prepared.document)
+        self._prepared = prepared
+
+    def build_xml(self, context, jinja_env=None):
+        if jinja_env is not None:
+            return super().build_xml(context, jinja_env)
+
+        self.current_rendering_part = self.docx._part
+        try:
+            dst_xml = self._prepared.body_template.render(context)
+        except TemplateError as exc:
+            _add_docx_context(exc, self._prepared.body_source)
+            raise
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+
+def _add_docx_context(exc: TemplateError, source: str) -> None:
+    """Как DocxTemplate.render_xml_part: строки шаблона вокруг ошибки, без тегов XML."""
+    lineno = getattr(exc, "lineno", None)
+    if lineno is not None:
+        line_number = max(lineno - 4, 0)
+        exc.docx_context = map(
+            lambda x: re.sub(r"<[^>]+>", "", x),
+            source.splitlines()[line_number:line_number + 7],
+        )
+
+
+_prepared_cache = LRUCache(
+    max_entries=getattr(settings, "DOCX_TEMPLATE_CACHE_SIZE", 64),
+    max_weight=getattr(settings, "DOCX_TEMPLATE_CACHE_MAX_BYTES", 128 * 1024 * 1024),
+    weigh=lambda item: item[1].weight,
+)
+
+
+def get_prepared_docx(template) -> PreparedDocx:
+    """
+    Предразобранный DOCX шаблона. Версия записи — имя файла и updated_at,
+    поэтому новый файл или восстановленная версия не отдадут устаревший кэш.
+    """
+    stamp = (template.docx_file.name, template.updated_at)
+    cached = _prepared_cache.get(template.pk)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with template.docx_file.open("rb") as f:
+        prepared = PreparedDocx(f.read())
+    _prepared_cache.set(template.pk, (stamp, prepared))
+    return prepared
+
+
+def invalidate_prepared_docx(template_id) -> None:
+    _prepared_cache.pop(template_id)
+
+
+def get_docx_cache_stats() -> Dict[str, Any]:
+    return _prepared_cache.stats()
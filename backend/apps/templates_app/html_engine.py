@@ -0,0 +1,66 @@
+"""
+Подстановка значений в HTML-шаблоны.
+
+Шаблон один раз разбивается на список литералов и имён плейсхолдеров,
+после чего каждый рендер — один линейный проход со склейкой строк,
+независимо от количества полей.
+"""
+import re
+from typing import Any, Dict, List
+
+from django.conf import settings
+
+from apps.common.caching import LRUCache
+
+# {{ key }} — ключ может быть любым (не только \w), как и раньше в re.escape(key)
+_PLACEHOLDER_SEGMENT_RE = re.compile(r"\{\{\s*([^{}]*?)\s*\}\}")
+
+
+class CompiledHtmlTemplate:
+    __slots__ = ("literals", "names", "raw")
+
+    def __init__(self, html_content: str):
+        self.literals: List[str] = []
+        self.names: List[str] = []
+        # исходный текст плейсхолдера — остаётся как есть, если значение не передали
+        self.raw: List[str] = []
+
+        pos = 0
+        html_content = html_content or ""
+        for match in _PLACEHOLDER_SEGMENT_RE.finditer(html_content):
+            self.literals.append(html_content[pos:match.start()])
+            self.names.append(match.group(1))
+            self.raw.append(match.group(0))
+            pos = match.end()
+        self.literals.append(html_content[pos:])
+
+    def render(self, values: Dict[str, Any]) -> str:
+        prepared = {
+            str(key): "" if value is None else str(value)
+            for key, value in (values or {}).items()
+        }
+        parts = [self.literals[0]]
+        for i, name in enumerate(self.names):
+            parts.append(prepared.get(name, self.raw[i]))
+            parts.append(self.literals[i + 1])
+        return "".join(parts)
+
+
+_compiled_cache = LRUCache(max_entries=getattr(settings, "HTML_TEMPLATE_CACHE_SIZE", 256))
+
+
+def get_compiled_html_template(template) -> CompiledHtmlTemplate:
+    """
+    Скомпилированный шаблон из LRU-кэша. Ключ — id шаблона, версия — updated_at:
+    после сохранения/восстановления версии запись компилируется заново.
+    """
+    if template.pk is None:
+        return CompiledHtmlTemplate(template.html_content)
+
+    cached = _compiled_cache.get(template.pk)
+    if cached is not None and cached[0] == template.updated_at:
+        return cached[1]
+
+    compiled = CompiledHtmlTemplate(template.html_content)
+    _compiled_cache.set(template.pk, (template.updated_at, compiled))
+    return compiled
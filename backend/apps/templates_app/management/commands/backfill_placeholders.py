@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from apps.templates_app.models import Template
+
+
+class Command(BaseCommand):
+    help = 'Extract and store placeholders for existing templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only-empty', action='store_true', help='Skip templates that already have placeholders')
+
+    def handle(self, *args, **options):
+        templates = Template.objects.all().order_by('id')
+        if options['only_empty']:
+            templates = templates.filter(placeholders=[])
+
+        updated = 0
+        for template in templates.iterator():
+            placeholders = template.extract_placeholders()
+            if placeholders != template.placeholders:
+                Template.objects.filter(pk=template.pk).update(placeholders=placeholders)
+                updated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Placeholders updated for {updated} template(s).'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_access_grants(apps, schema_editor):
+    Template = apps.get_model('templates_app', 'Template')
+    TemplateAccess = apps.get_model('templates_app', 'TemplateAccess')
+    grants = []
+    for template_id, allowed_users in Template.objects.values_list('id', 'allowed_users').iterator():
+        user_ids = set()
+        for user_id in allowed_users or []:
+            try:
+                user_ids.add(int(user_id))
+            except (TypeError, ValueError):
+                continue
+        grants.extend(TemplateAccess(template_id=template_id, user_id=user_id) for user_id in user_ids)
+    TemplateAccess.objects.bulk_create(grants, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates_app', '0003_template_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TemplateAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='template',
+            index=models.Index(fields=['visibility', '-updated_at'], name='templates_a_visibil_1071d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='template',
+            index=models.Index(fields=['owner_id', '-updated_at'], name='templates_a_owner_i_bc0804_idx'),
+        ),
+        migrations.AddField(
+            model_name='templateaccess',
+            name='template',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_grants', to='templates_app.template'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='templateaccess',
+            unique_together={('template', 'user_id')},
+        ),
+        migrations.RunPython(backfill_access_grants, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,33 @@
+import hashlib
 import uuid
 import re
 from django.db import models
 from django.utils import timezone
 
+from .docx_cache import invalidate_prepared_docx
+from .render_cache import invalidate_rendered
+
+PLACEHOLDER_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+
+class TemplateQuerySet(models.QuerySet):
+    def accessible_by(self, user_id):
+        """PUBLIC, свои и те, где пользователь в allowed_users — одним SQL-запросом."""
+        granted = TemplateAccess.objects.filter(template=models.OuterRef('pk'), user_id=user_id)
+        return self.filter(
+            models.Q(visibility='PUBLIC')
+            | models.Q(owner_id=user_id)
+            | models.Exists(granted)
+        )
+
+    def shared_with(self, user_id):
+        granted = TemplateAccess.objects.filter(template=models.OuterRef('pk'), user_id=user_id)
+        return (
+            self.filter(visibility='RESTRICTED')
+            .exclude(owner_id=user_id)
+            .filter(models.Exists(granted))
+        )
+
 
 class Template(models.Model):
     TEMPLATE_TYPE_CHOICES = [
@@ -25,10 +50,113 @@ class Template(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def get_placeholders(self):
+    # Плейсхолдеры извлекаются один раз при сохранении шаблона/файла и хранятся
+    # в колонке — списки и share_info не открывают DOCX на каждый запрос.
+    placeholders = models.JSONField(default=list, blank=True)
+    # sha256 содержимого (HTML или файла DOCX) — часть ключа кэша готовых документов
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+
+    objects = TemplateQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['visibility', '-updated_at']),
+            models.Index(fields=['owner_id', '-updated_at']),
+        ]
+
+    _content_source = None
+    _allowed_users_source = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'html_content' in instance.__dict__ and 'docx_file' in instance.__dict__:
+            instance._content_source = instance._get_content_source()
+        if 'allowed_users' in instance.__dict__:
+            instance._allowed_users_source = instance._get_allowed_user_ids()
+        return instance
+
+    def _get_allowed_user_ids(self):
+        user_ids = set()
+        for user_id in self.allowed_users or []:
+            try:
+                user_ids.add(int(user_id))
+            except (TypeError, ValueError):
+                continue
+        return user_ids
+
+    def _sync_access_grants(self, user_ids, adding=False):
+        """Нормализованная копия allowed_users для фильтрации доступа в SQL."""
+        existing = set()
+        if not adding:
+            self.access_grants.exclude(user_id__in=user_ids).delete()
+            existing = set(self.access_grants.values_list('user_id', flat=True))
+        TemplateAccess.objects.bulk_create(
+            [TemplateAccess(template=self, user_id=user_id) for user_id in user_ids - existing],
+            ignore_conflicts=True,
+        )
+        self._allowed_users_source = user_ids
+
+    def _get_content_source(self):
+        return (self.template_type, self.html_content, self.docx_file.name if self.docx_file else None)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        source = self._get_content_source()
+        changed = source != self._content_source
+        if changed and self.template_type != 'DOCX':
+            self.placeholders = self.extract_placeholders()
+            self.content_hash = self.compute_content_hash()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'placeholders', 'content_hash'}
+        super().save(*args, **kwargs)
+        if changed and self.template_type == 'DOCX':
+            # файл DOCX доступен по пути только после super().save()
+            self.placeholders = self.extract_placeholders()
+            self.content_hash = self.compute_content_hash()
+            type(self).objects.filter(pk=self.pk).update(
+                placeholders=self.placeholders,
+                content_hash=self.content_hash,
+            )
+            invalidate_prepared_docx(self.pk)
+        if changed and not adding:
+            invalidate_rendered(self.pk)
+        self._content_source = source
+
+        user_ids = self._get_allowed_user_ids()
+        if user_ids != self._allowed_users_source:
+            self._sync_access_grants(user_ids, adding=adding)
+
+    def delete(self, *args, **kwargs):
+        template_id = self.pk
+        result = super().delete(*args, **kwargs)
+        invalidate_prepared_docx(template_id)
+        invalidate_rendered(template_id)
+        return result
+
+    def compute_content_hash(self):
+        digest = hashlib.sha256(self.template_type.encode())
+        if self.template_type == 'HTML':
+            digest.update((self.html_content or '').encode('utf-8'))
+        elif self.template_type == 'DOCX' and self.docx_file:
+            try:
+                with self.docx_file.open('rb') as f:
+                    for chunk in f.chunks():
+                        digest.update(chunk)
+            except (OSError, ValueError):
+                return ''
+        return digest.hexdigest()
+
+    def get_content_hash(self):
+        # строки, созданные до появления колонки, досчитываются при первом обращении
+        if not self.content_hash:
+            self.content_hash = self.compute_content_hash()
+            type(self).objects.filter(pk=self.pk).update(content_hash=self.content_hash)
+        return self.content_hash
+
+    def extract_placeholders(self):
         if self.template_type == 'HTML':
-            pattern = r'\{\{\s*(\w+)\s*\}\}'
-            return list(set(re.findall(pattern, self.html_content)))
+            return sorted(set(PLACEHOLDER_RE.findall(self.html_content or '')))
         elif self.template_type == 'DOCX' and self.docx_file:
             from docx import Document
             try:
@@ -38,18 +166,21 @@ class Template(models.Model):
                     for row in table.rows:
                         for cell in row.cells:
                             text += '\n' + cell.text
-                pattern = r'\{\{\s*(\w+)\s*\}\}'
-                return list(set(re.findall(pattern, text)))
+                return sorted(set(PLACEHOLDER_RE.findall(text)))
             except Exception:
                 return []
         return []
 
+    def get_placeholders(self):
+        return list(self.placeholders or [])
+
     def is_accessible_by(self, user_id):
         if self.visibility == 'PUBLIC':
             return True
         if self.owner_id == user_id:
             return True
-        if user_id in self.allowed_users:
+        # те же правила, что в TemplateQuerySet.accessible_by: id приводятся к int
+        if user_id in self._get_allowed_user_ids():
             return True
         return False
 
@@ -57,6 +188,17 @@ class Template(models.Model):
         return self.title
 
 
+class TemplateAccess(models.Model):
+    template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name='access_grants')
+    user_id = models.IntegerField(db_index=True)
+
+    class Meta:
+        unique_together = ['template', 'user_id']
+
+    def __str__(self):
+        return f"{self.template.title} → user {self.user_id}"
+
+
 class TemplateVersion(models.Model):
     template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name='versions')
     version_number = models.IntegerField()
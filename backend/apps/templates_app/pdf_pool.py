@@ -0,0 +1,296 @@
+"""
+Пул «тёплых» браузеров Chromium для рендера HTML → PDF.
+
+Sync API Playwright привязан к потоку, в котором был создан, поэтому каждый
+браузер живёт в собственном потоке-воркере и получает задания через общую
+очередь. Число воркеров ограничивает количество одновременных рендеров.
+Браузер между заданиями остаётся запущенным, а контекст (cookies,
+localStorage, кэш) у каждого рендера свой.
+"""
+import atexit
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+_BASE_TAG_RE = re.compile(r"<base\s", re.IGNORECASE)
+_HEAD_TAG_RE = re.compile(r"<head(\s[^>]*)?>", re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r"<html(\s[^>]*)?>", re.IGNORECASE)
+_DOCTYPE_RE = re.compile(r"\s*<!doctype[^>]*>", re.IGNORECASE)
+
+
+def _inject_base_href(html: str, base_url: str) -> str:
+    """
+    page.set_content() не принимает base_url — поэтому относительные ссылки
+    резолвим через <base>.
+    """
+    if not base_url or _BASE_TAG_RE.search(html):
+        return html
+    tag = f'<base href="{base_url}">'
+    # без <head> — сразу после <html> или <!DOCTYPE>: тег перед doctype
+    # переключил бы Chromium в quirks mode и поменял вёрстку PDF
+    match = _HEAD_TAG_RE.search(html) or _HTML_TAG_RE.search(html) or _DOCTYPE_RE.match(html)
+    if match:
+        return html[:match.end()] + tag + html[match.end():]
+    return tag + html
+
+
+class _RenderJob:
+    __slots__ = ("html", "base_url", "future", "enqueued_at")
+
+    def __init__(self, html: str, base_url: str):
+        self.html = html
+        self.base_url = base_url
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _BrowserWorker(threading.Thread):
+    """Поток, владеющий одним браузером; на каждое задание — новый контекст."""
+
+    def __init__(self, pool: "BrowserPool", index: int):
+        super().__init__(name=f"pdf-browser-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self.browser = None
+        self.renders_since_launch = 0
+        self.busy = False
+        self.job: Optional[_RenderJob] = None
+
+    def run(self):
+        try:
+            try:
+                from playwright.sync_api import sync_playwright  # type: ignore
+
+                with sync_playwright() as p:
+                    self._serve(p)
+            except Exception as e:
+                # драйвер Playwright не стартовал — отвечаем ошибкой на все задания,
+                # чтобы запросы не висели до таймаута
+                self._serve(None, startup_error=e)
+        finally:
+            # поток умирает (ошибка вне рендера) — задание не должно висеть до таймаута;
+            # замену потоку поднимет BrowserPool.submit
+            job = self.job
+            if job is not None and not job.future.done():
+                job.future.set_exception(RuntimeError("PDF worker thread died."))
+
+    def _serve(self, p, startup_error: Optional[Exception] = None):
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if startup_error is not None:
+                self.pool._record_failure()
+                job.future.set_exception(RuntimeError(f"Chromium is not available: {startup_error}"))
+                continue
+            self.job = job
+            self.pool._record_wait(time.monotonic() - job.enqueued_at)
+            self.busy = True
+            started = time.monotonic()
+            try:
+                self._ensure_browser(p)
+                pdf_bytes = self._render(job)
+            except Exception as e:
+                self.pool._record_failure()
+                # браузер мог упасть или зависнуть — на следующем задании поднимем новый
+                self._close_browser()
+                job.future.set_exception(e)
+            else:
+                self.renders_since_launch += 1
+                self.pool._record_render(time.monotonic() - started)
+                job.future.set_result(pdf_bytes)
+            finally:
+                self.busy = False
+                self.job = None
+        self._close_browser()
+
+    def _ensure_browser(self, p):
+        recycle = self.renders_since_launch >= self.pool.max_renders_per_browser
+        if self.browser is not None and (recycle or not self.browser.is_connected()):
+            self._close_browser()
+        if self.browser is None:
+            self.browser = p.chromium.launch()
+            self.renders_since_launch = 0
+            self.pool._record_launch()
+
+    def _render(self, job: _RenderJob) -> bytes:
+        # свежий контекст: cookies, localStorage и кэш прошлых рендеров не видны
+        # Отключаем JS — минимальная защита от вставок <script> в шаблон
+        context = self.browser.new_context(java_script_enabled=False)
+        try:
+            context.set_default_timeout(self.pool.render_timeout * 1000)
+            page = context.new_page()
+            page.set_content(
+                _inject_base_href(job.html, job.base_url),
+                wait_until="networkidle",
+            )
+            return page.pdf(
+                format="A4",
+                print_background=True,
+                prefer_css_page_size=True,
+            )
+        finally:
+            context.close()
+
+    def _close_browser(self):
+        browser, self.browser = self.browser, None
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+
+
+class BrowserPool:
+    """
+    Процессный пул браузеров. Создаётся лениво при первом рендере
+    (см. get_browser_pool) и живёт до завершения процесса.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_renders_per_browser: int = 200,
+        render_timeout: float = 60,
+        queue_timeout: float = 60,
+    ):
+        self.size = max(1, int(size))
+        self.max_renders_per_browser = max(1, int(max_renders_per_browser))
+        self.render_timeout = render_timeout
+        self.queue_timeout = queue_timeout
+        self._jobs: "queue.Queue[Optional[_RenderJob]]" = queue.Queue()
+        self._workers: List[_BrowserWorker] = []
+        self._workers_lock = threading.Lock()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "renders": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "browser_launches": 0,
+            "worker_restarts": 0,
+            "render_seconds_total": 0.0,
+            "wait_seconds_total": 0.0,
+        }
+        for i in range(self.size):
+            worker = _BrowserWorker(self, i)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, html: str, base_url: str) -> Future:
+        """Ставит рендер в очередь, не дожидаясь результата."""
+        self._replace_dead_workers()
+        job = _RenderJob(html, base_url)
+        self._jobs.put(job)
+        return job.future
+
+    def wait(self, future: Future) -> bytes:
+        try:
+            return future.result(timeout=self.queue_timeout + self.render_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise
+
+    def render_pdf(self, html: str, base_url: str) -> bytes:
+        return self.wait(self.submit(html, base_url))
+
+    def shutdown(self):
+        with self._workers_lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=5)
+
+    def _replace_dead_workers(self):
+        """Умерший поток-воркер заменяется новым, иначе пул тихо теряет мощность."""
+        with self._workers_lock:
+            if self._closed:
+                return
+            for i, worker in enumerate(self._workers):
+                if not worker.is_alive():
+                    replacement = _BrowserWorker(self, worker.index)
+                    replacement.start()
+                    self._workers[i] = replacement
+                    with self._lock:
+                        self._stats["worker_restarts"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        renders = stats["renders"] or 1
+        jobs = (stats["renders"] + stats["failures"]) or 1
+        return {
+            "size": self.size,
+            "alive_workers": sum(1 for w in self._workers if w.is_alive()),
+            "busy_workers": sum(1 for w in self._workers if w.busy),
+            "queue_depth": self._jobs.qsize(),
+            "renders": int(stats["renders"]),
+            "failures": int(stats["failures"]),
+            "timeouts": int(stats["timeouts"]),
+            "browser_launches": int(stats["browser_launches"]),
+            "worker_restarts": int(stats["worker_restarts"]),
+            "avg_render_ms": round(stats["render_seconds_total"] / renders * 1000, 2),
+            "avg_wait_ms": round(stats["wait_seconds_total"] / jobs * 1000, 2),
+        }
+
+    # --- счётчики (вызываются из потоков-воркеров) ---
+    def _record_render(self, seconds: float):
+        with self._lock:
+            self._stats["renders"] += 1
+            self._stats["render_seconds_total"] += seconds
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self._stats["wait_seconds_total"] += seconds
+
+    def _record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+
+    def _record_launch(self):
+        with self._lock:
+            self._stats["browser_launches"] += 1
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                import playwright.sync_api  # noqa: F401  # type: ignore
+            except Exception as e:
+                # Если playwright не установлен — не валим весь сервер, а возвращаем понятную ошибку на уровне API
+                raise RuntimeError(
+                    "Playwright is not installed. Install it with: pip install playwright "
+                    "and then run: python -m playwright install chromium"
+                ) from e
+            _pool = BrowserPool(
+                size=getattr(settings, "PDF_POOL_SIZE", 2),
+                max_renders_per_browser=getattr(settings, "PDF_POOL_MAX_RENDERS_PER_BROWSER", 200),
+                render_timeout=getattr(settings, "PDF_POOL_RENDER_TIMEOUT", 60),
+                queue_timeout=getattr(settings, "PDF_POOL_QUEUE_TIMEOUT", 60),
+            )
+            atexit.register(_pool.shutdown)
+    return _pool
+
+
+def get_browser_pool_metrics() -> Optional[Dict[str, Any]]:
+    """Метрики пула или None, если пул ещё не запускался в этом процессе."""
+    return _pool.metrics() if _pool is not None else None
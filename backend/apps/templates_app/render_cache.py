@@ -0,0 +1,195 @@
+"""
+Кэш готовых документов (PDF/DOCX) с адресацией по содержимому.
+
+Ключ — sha256 от хэша содержимого шаблона, канонизированных значений и
+формата вывода. Два уровня: LRU в памяти процесса и каталог на диске,
+общий для всех воркеров. Оба уровня ограничены по размеру и по TTL.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from apps.common.caching import LRUCache
+
+CacheKey = Tuple[int, str]
+
+
+class RenderCache:
+    def __init__(
+        self,
+        memory_max_bytes: int,
+        memory_ttl: Optional[float],
+        disk_dir: Optional[str],
+        disk_max_bytes: int,
+        disk_ttl: Optional[float],
+    ):
+        self.memory = LRUCache(
+            max_entries=10000,
+            max_weight=memory_max_bytes,
+            ttl=memory_ttl,
+            weigh=len,
+        )
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_ttl = disk_ttl
+        self._disk_size: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(template, values: Dict[str, Any], fmt: str, base_url: str = "") -> CacheKey:
+        canonical = json.dumps(values or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        digest = hashlib.sha256(
+            "\x00".join([template.get_content_hash(), fmt, base_url, canonical]).encode("utf-8")
+        ).hexdigest()
+        return template.pk, digest
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        data = self.memory.get(key)
+        if data is not None:
+            self._count("hits", "memory_hits")
+            return data
+
+        data = self._disk_get(key)
+        if data is not None:
+            self.memory.set(key, data)
+            self._count("hits", "disk_hits")
+            return data
+
+        self._count("misses")
+        return None
+
+    def set(self, key: CacheKey, data: bytes) -> None:
+        self.memory.set(key, data)
+        self._disk_set(key, data)
+        self._count("stores")
+
+    def set_file(self, key: CacheKey, f: IO[bytes], memory_max_bytes: int) -> None:
+        """
+        Как set, но из открытого файла: в память — только файлы не больше
+        memory_max_bytes, на диск — копированием по частям. Позиция f
+        возвращается в начало.
+        """
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        if size <= memory_max_bytes:
+            data = f.read()
+            f.seek(0)
+            self.set(key, data)
+            return
+        self._disk_write(key, size, lambda out: shutil.copyfileobj(f, out))
+        f.seek(0)
+        self._count("stores")
+
+    def invalidate_template(self, template_id) -> None:
+        self.memory.discard_where(lambda key: key[0] == template_id)
+        if self.disk_dir is not None:
+            shutil.rmtree(self.disk_dir / str(template_id), ignore_errors=True)
+            with self._lock:
+                self._disk_size = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["disk_bytes"] = self._disk_size
+        stats["memory"] = self.memory.stats()
+        return stats
+
+    def _count(self, *names: str) -> None:
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    # --- дисковый уровень ---
+    def _path(self, key: CacheKey) -> Path:
+        return self.disk_dir / str(key[0]) / f"{key[1]}.bin"
+
+    def _disk_get(self, key: CacheKey) -> Optional[bytes]:
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if self.disk_ttl and stat.st_mtime + self.disk_ttl < time.time():
+                path.unlink(missing_ok=True)
+                return None
+            data = path.read_bytes()
+            # mtime служит меткой последнего обращения для LRU-очистки
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _disk_set(self, key: CacheKey, data: bytes) -> None:
+        self._disk_write(key, len(data), lambda out: out.write(data))
+
+    def _disk_write(self, key: CacheKey, size: int, write: Callable[[IO[bytes]], Any]) -> None:
+        if self.disk_dir is None or size > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += size
+            over_limit = self._disk_size is None or self._disk_size > self.disk_max_bytes
+        if over_limit:
+            self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        """Пересчитывает размер каталога и удаляет самые старые файлы сверх лимита."""
+        files = []
+        for path in self.disk_dir.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _mtime, size, _path in files)
+        now = time.time()
+        files.sort()
+        for mtime, size, path in files:
+            expired = self.disk_ttl and mtime + self.disk_ttl < now
+            if not expired and total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+        with self._lock:
+            self._disk_size = total
+
+
+render_cache: Optional[RenderCache] = None
+if getattr(settings, "RENDER_CACHE_ENABLED", True):
+    render_cache = RenderCache(
+        memory_max_bytes=getattr(settings, "RENDER_CACHE_MEMORY_MAX_BYTES", 64 * 1024 * 1024),
+        memory_ttl=getattr(settings, "RENDER_CACHE_MEMORY_TTL", 3600),
+        disk_dir=getattr(settings, "RENDER_CACHE_DIR", None),
+        disk_max_bytes=getattr(settings, "RENDER_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024),
+        disk_ttl=getattr(settings, "RENDER_CACHE_DISK_TTL", 7 * 24 * 3600),
+    )
+
+
+def invalidate_rendered(template_id) -> None:
+    if render_cache is not None:
+        render_cache.invalidate_template(template_id)
+
+
+def get_render_cache_stats() -> Optional[Dict[str, Any]]:
+    return render_cache.stats() if render_cache is not None else None
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Template, TemplateVersion, ShareLink
 
@@ -45,6 +46,9 @@ class TemplateSerializer(serializers.ModelSerializer):
         return obj.get_placeholders()
 
     def get_latest_version(self, obj):
+        # TemplateViewSet аннотирует queryset (Max по versions), без неё — один запрос
+        if hasattr(obj, 'latest_version_number'):
+            return obj.latest_version_number or 0
         version = obj.versions.first()
         if version:
             return version.version_number
@@ -67,3 +71,18 @@ class TemplateListSerializer(serializers.ModelSerializer):
 
 class RenderSerializer(serializers.Serializer):
     values = serializers.DictField(child=serializers.CharField(allow_blank=True))
+
+
+class BatchRenderSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=serializers.DictField(child=serializers.CharField(allow_blank=True)),
+        allow_empty=False,
+    )
+    output = serializers.ChoiceField(choices=['zip', 'pdf'], default='zip')
+    filename_field = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_items(self, value):
+        max_items = getattr(settings, 'RENDER_BATCH_MAX_ITEMS', 50000)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f'Batch is limited to {max_items} items.')
+        return value
@@ -0,0 +1,228 @@
+import io
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+import pdfplumber
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from docx import Document
+from docxtpl import DocxTemplate
+from jinja2 import TemplateSyntaxError
+from reportlab.pdfgen import canvas
+
+from .batch import BATCH_ERRORS_NAME, merge_pdfs
+from .docx_cache import PreparedDocx
+from .models import ShareLink, Template, TemplateVersion
+from .pdf_pool import BrowserPool, _BrowserWorker, _inject_base_href
+
+
+class TemplateAccessTests(TestCase):
+    def test_string_user_ids_in_allowed_users(self):
+        template = Template.objects.create(
+            title='Shared', template_type='HTML', visibility='RESTRICTED', owner_id=2,
+            allowed_users=['1'], html_content='<p>{{ name }}</p>',
+        )
+
+        listed = [item['id'] for item in self.client.get('/api/templates/').json()]
+        self.assertIn(template.pk, listed)
+        self.assertTrue(template.is_accessible_by(1))
+        self.assertEqual(self.client.get(f'/api/templates/{template.pk}/').status_code, 200)
+
+    def test_restricted_template_without_grant(self):
+        template = Template.objects.create(
+            title='Private', template_type='HTML', visibility='RESTRICTED', owner_id=2, allowed_users=['3'],
+        )
+
+        listed = [item['id'] for item in self.client.get('/api/templates/').json()]
+        self.assertNotIn(template.pk, listed)
+        self.assertFalse(template.is_accessible_by(1))
+
+
+class TemplateQueryCountTests(TestCase):
+    """Число запросов не зависит от числа шаблонов, ссылок и версий."""
+
+    def create_templates(self, count):
+        templates = []
+        for i in range(count):
+            template = Template.objects.create(
+                title=f'T{i}', template_type='HTML', visibility='PUBLIC', html_content=f'<p>{{{{ v{i} }}}}</p>',
+            )
+            TemplateVersion.objects.create(template=template, version_number=1, html_content=template.html_content)
+            ShareLink.objects.create(template=template)
+            templates.append(template)
+        return templates
+
+    def test_list(self):
+        self.create_templates(30)
+        for page_size in (1, 10, 30):
+            with self.subTest(page_size=page_size), self.assertNumQueries(2):  # COUNT + страница
+                response = self.client.get(f'/api/templates/?page_size={page_size}')
+            self.assertEqual(len(response.json()['results']), page_size)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/templates/').json()), 30)
+
+    def test_detail(self):
+        template = self.create_templates(1)[0]
+        for links in (1, 5, 20):
+            ShareLink.objects.bulk_create(
+                ShareLink(template=template) for _ in range(links - template.share_links.count())
+            )
+            with self.subTest(share_links=links), self.assertNumQueries(2):  # шаблон + share_links
+                response = self.client.get(f'/api/templates/{template.pk}/')
+            self.assertEqual(len(response.json()['share_links']), links)
+            self.assertEqual(response.json()['latest_version'], 1)
+
+    def test_versions_skip_detail_annotation(self):
+        template = self.create_templates(1)[0]
+        with self.assertNumQueries(2) as queries:  # шаблон + версии
+            self.client.get(f'/api/templates/{template.pk}/versions/')
+        self.assertNotIn('MAX(', queries.captured_queries[0]['sql'].upper())
+
+
+class InjectBaseHrefTests(SimpleTestCase):
+    base = '<base href="http://testserver/">'
+
+    def inject(self, html):
+        return _inject_base_href(html, 'http://testserver/')
+
+    def test_after_head(self):
+        self.assertEqual(self.inject('<!DOCTYPE html><html><head><title>x</title></head></html>'),
+                         f'<!DOCTYPE html><html><head>{self.base}<title>x</title></head></html>')
+
+    def test_keeps_doctype_first_without_head(self):
+        self.assertEqual(self.inject('<!DOCTYPE html>\n<html lang="ru"><body>x</body></html>'),
+                         f'<!DOCTYPE html>\n<html lang="ru">{self.base}<body>x</body></html>')
+        self.assertEqual(self.inject('<!doctype html><p>x</p>'), f'<!doctype html>{self.base}<p>x</p>')
+
+    def test_fragment(self):
+        self.assertEqual(self.inject('<p>x</p>'), f'{self.base}<p>x</p>')
+
+    def test_existing_base(self):
+        html = '<head><base href="/other/"></head>'
+        self.assertEqual(self.inject(html), html)
+
+
+def make_pdf(*pages):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for text in pages:
+        pdf.drawString(72, 720, text)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def docx_text(blob):
+    return '\n'.join(paragraph.text for paragraph in Document(io.BytesIO(blob)).paragraphs)
+
+
+class MergePdfsTests(SimpleTestCase):
+    def test_pages_in_order(self):
+        out = io.BytesIO()
+        merge_pdfs(iter([make_pdf('a1'), make_pdf('b1', 'b2', 'b3'), make_pdf('c1', 'c2')]), out)
+
+        with pdfplumber.open(io.BytesIO(out.getvalue())) as pdf:
+            self.assertEqual([page.extract_text() for page in pdf.pages], ['a1', 'b1', 'b2', 'b3', 'c1', 'c2'])
+
+
+@override_settings(RENDER_BATCH_WORKERS=2, RENDER_BATCH_PARALLEL_MIN_ITEMS=2)
+class DocxBatchRenderTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        document = Document()
+        document.add_paragraph('{{ 100 // (n|int) }}')
+        buffer = io.BytesIO()
+        document.save(buffer)
+        self.template = Template.objects.create(title='Batch', template_type='DOCX', visibility='PUBLIC')
+        self.template.docx_file.save('batch.docx', ContentFile(buffer.getvalue()))
+
+    def render(self, *values):
+        return self.client.post(f'/api/templates/{self.template.pk}/render-batch/',
+                                {'items': [{'n': n} for n in values]}, content_type='application/json')
+
+    def read_zip(self, response):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_parallel_results_in_order(self):
+        files = self.read_zip(self.render('1', '2', '4', '5', '10'))
+
+        self.assertEqual([docx_text(blob) for blob in files.values()], ['100', '50', '25', '20', '10'])
+
+    def test_error_mid_stream_is_reported_in_archive(self):
+        files = self.read_zip(self.render('1', '2', '0', '5'))
+
+        self.assertEqual(len(files), 3)
+        self.assertIn('document 3', files[BATCH_ERRORS_NAME].decode())
+
+    def test_error_on_first_document_fails_request(self):
+        response = self.render('0', '1')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class PreparedDocxErrorTests(SimpleTestCase):
+    def test_syntax_error_has_docx_context(self):
+        document = Document()
+        for text in ('Dear {{ name }},', 'before', 'broken {{ total }', 'after'):
+            document.add_paragraph(text)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        blob = buffer.getvalue()
+
+        with self.assertRaises(TemplateSyntaxError) as docxtpl_error:
+            DocxTemplate(io.BytesIO(blob)).render({})
+        with self.assertRaises(TemplateSyntaxError) as prepared_error:
+            PreparedDocx(blob).new_template().render({})
+
+        expected = list(docxtpl_error.exception.docx_context)
+        self.assertIn('before', expected)
+        self.assertEqual(list(prepared_error.exception.docx_context), expected)
+
+
+class BrowserPoolWorkerTests(SimpleTestCase):
+    def test_dead_workers_are_replaced(self):
+        calls = []
+
+        def run(worker):
+            calls.append(worker.index)
+            if len(calls) <= 2:
+                return  # первые потоки умирают сразу после старта
+            worker._serve(None, startup_error=RuntimeError('no browser'))
+
+        with mock.patch.object(_BrowserWorker, 'run', run):
+            pool = BrowserPool(size=2)
+            self.addCleanup(pool.shutdown)
+            for worker in list(pool._workers):
+                worker.join(timeout=5)
+
+            future = pool.submit('<p>x</p>', '')
+            with self.assertRaisesRegex(RuntimeError, 'Chromium is not available'):
+                pool.wait(future)
+
+        metrics = pool.metrics()
+        self.assertEqual((metrics['worker_restarts'], metrics['alive_workers']), (2, 2))
+
+    def test_job_of_crashed_worker_fails_fast(self):
+        def serve(worker, p, startup_error=None):
+            # падает и основной цикл, и запасной (startup_error) — поток умирает с заданием на руках
+            if worker.job is None:
+                worker.job = worker.pool._jobs.get()
+                worker.job.future.set_running_or_notify_cancel()
+            raise SystemError('worker crashed')
+
+        with mock.patch.object(_BrowserWorker, '_serve', serve), \
+                mock.patch('threading.excepthook'):
+            pool = BrowserPool(size=1)
+            self.addCleanup(pool.shutdown)
+            future = pool.submit('<p>x</p>', '')
+            with self.assertRaisesRegex(RuntimeError, 'worker thread died'):
+                future.result(timeout=5)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TemplateViewSet, share_info, share_render
+from .views import TemplateViewSet, share_info, share_render, render_metrics
 
 router = DefaultRouter()
 router.register(r'templates', TemplateViewSet, basename='template')
@@ -9,4 +9,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('share/<str:token>/', share_info, name='share-info'),
     path('share/<str:token>/render/', share_render, name='share-render'),
+    path('render-metrics/', render_metrics, name='render-metrics'),
 ]
@@ -1,20 +1,27 @@
 import io
-import re
-from typing import Any, Dict, Optional
+import itertools
+import tempfile
+from typing import Any, Dict, List, Optional
 
 from django.conf import settings
-from django.http import HttpResponse
+from django.db.models import Max
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 
-from docxtpl import DocxTemplate
-
+from .batch import iter_rendered_docx, iter_rendered_html_pdf, merge_pdfs, stream_zip
+from .docx_cache import get_prepared_docx, get_docx_cache_stats
+from .html_engine import get_compiled_html_template
 from .models import Template, TemplateVersion, ShareLink
+from .pagination import OptionalPageNumberPagination
+from .pdf_pool import get_browser_pool, get_browser_pool_metrics
+from .render_cache import render_cache, get_render_cache_stats
 from .serializers import (
     TemplateSerializer, TemplateListSerializer,
-    TemplateVersionSerializer, ShareLinkSerializer, RenderSerializer
+    TemplateVersionSerializer, ShareLinkSerializer, RenderSerializer,
+    BatchRenderSerializer,
 )
 
 CURRENT_USER_ID = getattr(settings, 'CURRENT_USER_ID', 1)
@@ -25,33 +32,10 @@ def _html_to_pdf_bytes_playwright(html: str, base_url: str) -> bytes:
     """
     Генерация PDF из HTML через Chromium (Playwright).
     Важно: это заменяет WeasyPrint и не требует GTK/Pango на Windows.
+    Браузеры не запускаются на каждый запрос — рендер идёт через
+    процессный пул тёплых Chromium (см. pdf_pool.py).
     """
-    try:
-        from playwright.sync_api import sync_playwright  # type: ignore
-    except Exception as e:
-        # Если playwright не установлен — не валим весь сервер, а возвращаем понятную ошибку на уровне API
-        raise RuntimeError(
-            "Playwright is not installed. Install it with: pip install playwright "
-            "and then run: python -m playwright install chromium"
-        ) from e
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        try:
-            # Отключаем JS — полезно как минимальная защита от вставок <script> в шаблон
-            page = browser.new_page(java_script_enabled=False)
-
-            # set_content + base_url позволяет подтягивать относительные ссылки (/static/..., картинки и т.п.)
-            page.set_content(html, wait_until="networkidle", base_url=base_url)
-
-            pdf_bytes = page.pdf(
-                format="A4",
-                print_background=True,
-                prefer_css_page_size=True,
-            )
-            return pdf_bytes
-        finally:
-            browser.close()
+    return get_browser_pool().render_pdf(html, base_url=base_url)
 
 
 def _get_base_url_from_request(request) -> str:
@@ -71,31 +55,32 @@ def _safe_filename(name: str, default: str) -> str:
     return name or default
 
 
-def _apply_placeholders_html(html_content: str, values: Dict[str, Any]) -> str:
-    """
-    Заменяет {{ key }} на значение.
-    Важно: используем функцию-замену, чтобы спецсимволы в value не ломали re.sub.
-    """
-    result = html_content or ""
-    for key, value in (values or {}).items():
-        k = str(key)
-        v = "" if value is None else str(value)
-        pattern = r"\{\{\s*" + re.escape(k) + r"\s*\}\}"
-        result = re.sub(pattern, lambda _m, vv=v: vv, result)
-    return result
-
-
 class TemplateViewSet(viewsets.ModelViewSet):
     queryset = Template.objects.all()
     serializer_class = TemplateSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = OptionalPageNumberPagination
 
     def get_serializer_class(self):
         if self.action == "list":
             return TemplateListSerializer
         return TemplateSerializer
 
+    # действия, которые отдают TemplateSerializer по объекту из get_object()
+    DETAIL_SERIALIZER_ACTIONS = ("retrieve", "update", "partial_update", "restore_version")
+
     def get_queryset(self):
+        queryset = self._get_scope_queryset()
+        if self.action not in self.DETAIL_SERIALIZER_ACTIONS:
+            # list (TemplateListSerializer) берёт всё из колонок самой таблицы,
+            # render/versions/destroy сериализатор шаблона не используют
+            return queryset
+        # share_links одним запросом, номер последней версии — агрегатом в том же SELECT
+        return queryset.annotate(
+            latest_version_number=Max("versions__version_number"),
+        ).prefetch_related("share_links")
+
+    def _get_scope_queryset(self):
         scope = self.request.query_params.get("scope", "all")
 
         if scope == "public":
@@ -105,23 +90,10 @@ class TemplateViewSet(viewsets.ModelViewSet):
             return Template.objects.filter(owner_id=CURRENT_USER_ID).order_by("-updated_at")
 
         if scope == "shared":
-            all_templates = (
-                Template.objects.filter(visibility="RESTRICTED")
-                .exclude(owner_id=CURRENT_USER_ID)
-                .order_by("-updated_at")
-            )
-            ids = [t.id for t in all_templates if CURRENT_USER_ID in (t.allowed_users or [])]
-            return Template.objects.filter(id__in=ids).order_by("-updated_at")
+            return Template.objects.shared_with(CURRENT_USER_ID).order_by("-updated_at")
 
         # scope == "all"
-        all_templates = Template.objects.all()
-        ids = [
-            t.id for t in all_templates
-            if t.visibility == "PUBLIC"
-            or t.owner_id == CURRENT_USER_ID
-            or CURRENT_USER_ID in (t.allowed_users or [])
-        ]
-        return Template.objects.filter(id__in=ids).order_by("-updated_at")
+        return Template.objects.accessible_by(CURRENT_USER_ID).order_by("-updated_at")
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -164,6 +136,7 @@ class TemplateViewSet(viewsets.ModelViewSet):
                 html_content=old_html,
                 docx_file=old_docx,
             )
+            instance.latest_version_number = version_count + 1
 
         return Response(serializer.data)
 
@@ -204,6 +177,7 @@ class TemplateViewSet(viewsets.ModelViewSet):
             html_content=template.html_content,
             docx_file=template.docx_file.name if template.docx_file else None,
         )
+        template.latest_version_number = version_count + 1
 
         template.html_content = version.html_content
         if version.docx_file:
@@ -243,27 +217,50 @@ class TemplateViewSet(viewsets.ModelViewSet):
 
         return render_template(request, template, values)
 
+    @action(detail=True, methods=["post"], url_path="render-batch")
+    def render_batch(self, request, pk=None):
+        template = self.get_object()
+        if not template.is_accessible_by(CURRENT_USER_ID):
+            return Response({"error": "Access denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = BatchRenderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return render_template_batch(request, template, serializer.validated_data)
+
+
+def _render_cache_key(template: Template, values: Dict[str, Any], fmt: str, base_url: str = ""):
+    if render_cache is None:
+        return None
+    return render_cache.make_key(template, values, fmt, base_url)
+
 
 def render_template(request, template: Template, values: Dict[str, Any]):
     if template.template_type == "HTML":
-        html_content = _apply_placeholders_html(template.html_content or "", values)
-
         base_url = _get_base_url_from_request(request)
 
-        try:
-            pdf_bytes = _html_to_pdf_bytes_playwright(html_content, base_url=base_url)
-        except RuntimeError as e:
-            # Playwright не установлен/не готов
-            return Response(
-                {"error": "PDF engine is not available on this server.", "detail": str(e)},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE,
-            )
-        except Exception as e:
-            # Любая другая ошибка рендера
-            return Response(
-                {"error": "Failed to render PDF.", "detail": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        # одинаковые (шаблон, значения) — частый случай для публичных share-ссылок
+        cache_key = _render_cache_key(template, values, "pdf", base_url)
+        pdf_bytes = render_cache.get(cache_key) if cache_key else None
+
+        if pdf_bytes is None:
+            html_content = get_compiled_html_template(template).render(values)
+            try:
+                pdf_bytes = _html_to_pdf_bytes_playwright(html_content, base_url=base_url)
+            except RuntimeError as e:
+                # Playwright не установлен/не готов
+                return Response(
+                    {"error": "PDF engine is not available on this server.", "detail": str(e)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+            except Exception as e:
+                # Любая другая ошибка рендера
+                return Response(
+                    {"error": "Failed to render PDF.", "detail": str(e)},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            if cache_key:
+                render_cache.set(cache_key, pdf_bytes)
 
         filename = _safe_filename(template.title, "template") + ".pdf"
         response = HttpResponse(pdf_bytes, content_type="application/pdf")
@@ -274,24 +271,107 @@ def render_template(request, template: Template, values: Dict[str, Any]):
         if not template.docx_file:
             return Response({"error": "No DOCX template file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
 
-        doc = DocxTemplate(template.docx_file.path)
-        doc.render(values or {})
+        cache_key = _render_cache_key(template, values, "docx")
+        docx_bytes = render_cache.get(cache_key) if cache_key else None
 
-        docx_buffer = io.BytesIO()
-        doc.save(docx_buffer)
-        docx_buffer.seek(0)
+        if docx_bytes is not None:
+            docx_file = io.BytesIO(docx_bytes)
+        else:
+            doc = get_prepared_docx(template).new_template()
+            doc.render(values or {})
+
+            # в памяти — только небольшие документы, большие уходят во временный файл
+            spool_max = getattr(settings, "EXPORT_SPOOL_MAX_MEMORY", 1024 * 1024)
+            docx_file = tempfile.SpooledTemporaryFile(max_size=spool_max)
+            doc.save(docx_file)
+            docx_file.seek(0)
+            if cache_key:
+                render_cache.set_file(cache_key, docx_file, memory_max_bytes=spool_max)
 
         filename = _safe_filename(template.title, "template") + ".docx"
-        response = HttpResponse(
-            docx_buffer.read(),
+        return FileResponse(
+            docx_file,
+            as_attachment=True,
+            filename=filename,
             content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         )
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
 
     return Response({"error": "Invalid template type."}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _batch_filenames(template: Template, items: List[Dict[str, Any]], filename_field: str, ext: str):
+    default = _safe_filename(template.title, "template")
+    for index, values in enumerate(items, start=1):
+        base = _safe_filename(values.get(filename_field, "") if filename_field else "", default)
+        base = base.replace("/", "_").replace("\\", "_")
+        yield f"{index:05d}_{base}.{ext}"
+
+
+def render_template_batch(request, template: Template, data: Dict[str, Any]):
+    """
+    Mail merge: один шаблон, много наборов значений.
+    output=zip — потоковый ZIP с документом на каждый набор,
+    output=pdf — один склеенный PDF (только для HTML-шаблонов).
+    """
+    items = data["items"]
+    output = data["output"]
+
+    if template.template_type == "HTML":
+        try:
+            get_browser_pool()
+        except RuntimeError as e:
+            return Response(
+                {"error": "PDF engine is not available on this server.", "detail": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        documents = iter_rendered_html_pdf(template, items, base_url=_get_base_url_from_request(request))
+        ext = "pdf"
+    elif template.template_type == "DOCX":
+        if not template.docx_file:
+            return Response({"error": "No DOCX template file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+        if output == "pdf":
+            return Response(
+                {"error": "Merged PDF output is only available for HTML templates."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        documents = iter_rendered_docx(template, items)
+        ext = "docx"
+    else:
+        return Response({"error": "Invalid template type."}, status=status.HTTP_400_BAD_REQUEST)
+
+    filename = _safe_filename(template.title, "template")
+
+    if output == "pdf":
+        merged = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+        try:
+            merge_pdfs(documents, merged)
+        except Exception as e:
+            merged.close()
+            return Response(
+                {"error": "Failed to render PDF.", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        merged.seek(0)
+        return FileResponse(merged, as_attachment=True, filename=f"{filename}.pdf", content_type="application/pdf")
+
+    entries = zip(_batch_filenames(template, items, data["filename_field"], ext), documents)
+    # первый документ — до отправки заголовков: ошибка самого шаблона вернётся
+    # обычным ответом, а не архивом из одного ERRORS.txt
+    try:
+        first = next(entries, None)
+    except Exception as e:
+        return Response(
+            {"error": f"Failed to render {ext.upper()}.", "detail": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+    if first is not None:
+        entries = itertools.chain([first], entries)
+    # DOCX уже сжат внутри, повторно его жать бессмысленно
+    response = StreamingHttpResponse(stream_zip(entries, compress=(ext == "pdf")), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.zip"'
+    return response
+
+
 @api_view(["GET"])
 def share_info(request, token):
     try:
@@ -338,3 +418,12 @@ def share_render(request, token):
     share_link.increment_use()
 
     return render_template(request, share_link.template, values)
+
+
+@api_view(["GET"])
+def render_metrics(request):
+    return Response({
+        "pdf_pool": get_browser_pool_metrics(),
+        "docx_templates": get_docx_cache_stats(),
+        "render_cache": get_render_cache_stats(),
+    })
@@ -77,3 +77,69 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024
 
 CURRENT_USER_ID = 1
+
+# Пул Chromium для HTML → PDF (apps/templates_app/pdf_pool.py)
+PDF_POOL_SIZE = int(os.environ.get('PDF_POOL_SIZE', 2))
+PDF_POOL_MAX_RENDERS_PER_BROWSER = int(os.environ.get('PDF_POOL_MAX_RENDERS_PER_BROWSER', 200))
+PDF_POOL_RENDER_TIMEOUT = 60
+PDF_POOL_QUEUE_TIMEOUT = 60
+
+# LRU-кэш скомпилированных HTML-шаблонов (apps/templates_app/html_engine.py)
+HTML_TEMPLATE_CACHE_SIZE = 256
+
+# Кэш предразобранных DOCX-шаблонов (apps/templates_app/docx_cache.py)
+DOCX_TEMPLATE_CACHE_SIZE = 64
+DOCX_TEMPLATE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# Пакетный рендер POST /api/templates/{id}/render-batch/ (apps/templates_app/batch.py)
+RENDER_BATCH_MAX_ITEMS = 50000
+RENDER_BATCH_WORKERS = int(os.environ.get('RENDER_BATCH_WORKERS', os.cpu_count() or 1))
+RENDER_BATCH_PARALLEL_MIN_ITEMS = 16
+# сколько разобранных DOCX-шаблонов держит каждый процесс пула
+RENDER_BATCH_WORKER_TEMPLATES = 8
+
+# Кэш готовых документов (apps/templates_app/render_cache.py)
+RENDER_CACHE_ENABLED = os.environ.get('RENDER_CACHE_ENABLED', 'True').lower() == 'true'
+RENDER_CACHE_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+RENDER_CACHE_MEMORY_TTL = 60 * 60
+RENDER_CACHE_DIR = BASE_DIR / 'cache' / 'renders'  # None — только память
+RENDER_CACHE_DISK_MAX_BYTES = 1024 * 1024 * 1024
+RENDER_CACHE_DISK_TTL = 7 * 24 * 60 * 60
+
+# POST /api/parse/?stream=1 — как часто дописывать разобранное в БД (в страницах)
+PARSE_STREAM_PERSIST_EVERY = 10
+
+# Параллельный разбор больших PDF по диапазонам страниц (apps/parser_app/utils/page_pool.py)
+PDF_PARALLEL_WORKERS = int(os.environ.get('PDF_PARALLEL_WORKERS', os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = 40
+
+# Картинки при импорте DOCX (apps/parser_app/utils/images.py)
+PARSE_IMAGE_RETINA_FACTOR = 2
+PARSE_IMAGE_JPEG_QUALITY = 82
+PARSE_IMAGE_WORKERS = int(os.environ.get('PARSE_IMAGE_WORKERS', 4))
+PARSE_IMAGE_PARALLEL_MIN = 4  # меньше картинок — без пула потоков
+
+# Фоновый разбор POST /api/parse/?async=1 (manage.py parse_worker, apps/parser_app/jobs.py)
+PARSE_JOB_POLL_INTERVAL = 1.0  # сек, пауза воркера при пустой очереди
+PARSE_JOB_STALE_AFTER = 300  # сек без отметки — задание возвращается в очередь
+PARSE_JOB_HEARTBEAT_INTERVAL = 30  # сек, отметка идущего задания (меньше PARSE_JOB_STALE_AFTER)
+
+# Разбор PDF с ограниченной памятью: документ переоткрывается каждые N страниц,
+# чтобы pdfminer не копил объекты всего файла (0 — не переоткрывать)
+PDF_REOPEN_EVERY_PAGES = int(os.environ.get('PDF_REOPEN_EVERY_PAGES', 50))
+
+# Быстрое чтение DOCX через lxml (apps/parser_app/utils/docx_xml.py); False — только python-docx
+PARSE_DOCX_LXML = True
+
+# Кэш экспорта проектов в DOCX/PDF (apps/doc_builder/export_cache.py)
+EXPORT_CACHE_ENABLED = os.environ.get('EXPORT_CACHE_ENABLED', 'True').lower() == 'true'
+EXPORT_CACHE_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+EXPORT_CACHE_MEMORY_TTL = 60 * 60
+
+# Фоновый экспорт POST .../export/{docx,pdf}/?async=1 (apps/doc_builder/export_jobs.py)
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_TIMEOUT = 600  # сек в очереди — задание считается потерянным (перезапуск процесса)
+
+# Экспорт и рендер DOCX/PDF пишутся в SpooledTemporaryFile и отдаются FileResponse:
+# до этого размера файл держится в памяти (и попадает в кэши в памяти), больше — на диске
+EXPORT_SPOOL_MAX_MEMORY = 1024 * 1024